@@ -5,10 +5,33 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import copy
 import json
+import threading
 
+import pylos
 from lib import game
 
+# Seconds given to the engine to suggest a move
+DEFAULT_HINT_TIME = 0.5
+
+
+# return a key identifying a move, whatever the order of its removed spheres
+def movekey(move):
+    move = dict(move)
+    if 'remove' in move:
+        move['remove'] = sorted(list(coord) for coord in move['remove'])
+    return json.dumps(move, sort_keys=True)
+
+
+# return a short description of a move
+def move2str(move):
+    text = '{} {}'.format(move['move'], move['to']) if move['move'] == 'place' else \
+        'move {} -> {}'.format(move['from'], move['to'])
+    if move.get('remove'):
+        text += ', remove {}'.format(' '.join(str(coord) for coord in move['remove']))
+    return text
+
 
 class PylosState(game.GameState):
     """Class representing a state for the Pylos game."""
@@ -193,9 +216,13 @@ class PylosServer(game.GameServer):
 class PylosClient(game.GameClient):
     """Class representing a client for the Pylos game."""
 
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, PylosState, verbose=verbose)
+    def __init__(self, name, server, verbose=False, hinttime=DEFAULT_HINT_TIME):
         self.__name = name
+        self.__hinttime = hinttime
+        self.__engine = pylos.PylosEngine() if hinttime > 0 else None
+        self.__hint = None
+        self.__hintthread = None
+        super().__init__(server, PylosState, verbose=verbose)
 
     def cancelupdate(self, state, move, player):
         st = state._state['visible']
@@ -230,37 +257,70 @@ class PylosClient(game.GameClient):
     def _handle(self, message):
         pass
 
+    # search a suggested move in the background, within the hint time
+    def __starthint(self, reference):
+        if self.__engine is None:
+            return
+        if self.__hintthread is not None:
+            # the previous search ends by itself within its time limit
+            self.__hintthread.join()
+        self.__hint = None
+        timelimit = self.__hinttime
+        if self._timemanager is not None:
+            timelimit = min(timelimit, self._timemanager.budget() / 4000)
+
+        def search():
+            self.__hint = self.__engine.bestmove(reference, timelimit)
+
+        self.__hintthread = threading.Thread(target=search, daemon=True)
+        self.__hintthread.start()
+
+    def __printmoves(self, moves):
+        for i, move in enumerate(moves):
+            print(' {:>3}: {}'.format(i + 1, move2str(move)))
+
+    # return the move chosen among 'moves' from an answer, or None
+    def __choose(self, answer, moves, keys):
+        if answer.isdigit():
+            if 1 <= int(answer) <= len(moves):
+                return moves[int(answer) - 1]
+            print('There is no move {}, choose between 1 and {}.'.format(answer, len(moves)))
+            return None
+        try:
+            move = json.loads(answer)
+            index = keys.index(movekey(move))
+        except (json.JSONDecodeError, TypeError, KeyError, AttributeError):
+            print('Enter the number of a move, a move in JSON, "list" or "hint".')
+            return None
+        except ValueError:
+            print('This move is not valid.')
+            return None
+        return moves[index]
+
     # return move as string
     def _nextmove(self, state):
-        player = state._state['visible']['turn']
-        noplayer = (player + 1) % 2
-        move = dict()
-        move['move'] = str(input('Place or Move?: '))
-        if move['move'] == 'place':
-            layer = int(input('Etage: '))
-            row = int(input('Ligne: '))
-            column =int(input('Collonne: '))
-            move['to'] = [layer, row, column]
-        elif move['move'] == 'move':
-            print('De')
-            layer = int(input('Etage: '))
-            row = int(input('Ligne: '))
-            column = int(input('Collonne: '))
-            move['from'] = [layer, row, column]
-            print('Vers')
-            layer = int(input('Etage: '))
-            row = int(input('Ligne: '))
-            column = int(input('Collonne: '))
-            move['to'] = [layer, row, column]
-        state.update(move, player)
-        if state.createSquare(move['to']):
-            move['remove'] = []
-            retir = int(input('Combien de bille a retirer? '))
-            while len(move['remove']) < retir:
-                layer = int(input('Etage: '))
-                row = int(input('Ligne: '))
-                column = int(input('Collonne: '))
-                move['remove'].append([layer, row, column])
+        # the valid moves are known before the first prompt, the answers are checked locally
+        reference = pylos.PylosState(copy.deepcopy(state._state['visible']))
+        moves = reference.moves()
+        keys = [movekey(move) for move in moves]
+        self.__starthint(copy.deepcopy(reference))
+        print('{} valid moves:'.format(len(moves)))
+        self.__printmoves(moves)
+        move = None
+        while move is None:
+            answer = input('Move (number, JSON, list or hint): ').strip()
+            if answer == 'list':
+                self.__printmoves(moves)
+            elif answer == 'hint':
+                if self.__engine is None:
+                    print('The hints are disabled.')
+                elif self.__hint is None:
+                    # never wait for the engine
+                    print('The engine is still thinking, ask again in a moment.')
+                else:
+                    print('Suggested move: {}: {}'.format(keys.index(movekey(self.__hint)) + 1, move2str(self.__hint)))
+            elif answer != '':
+                move = self.__choose(answer, moves, keys)
         return json.dumps(move)
 
 if __name__ == '__main__':
@@ -278,9 +338,11 @@ if __name__ == '__main__':
     client_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     client_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     client_parser.add_argument('--verbose', action='store_true')
+    client_parser.add_argument('--hint-time', help='seconds of search of the suggested moves, 0 to disable them (default: {})'
+                               .format(DEFAULT_HINT_TIME), type=float, default=DEFAULT_HINT_TIME, dest='hinttime')
     # Parse the arguments of sys.args
     args = parser.parse_args()
     if args.component == 'server':
         PylosServer(verbose=args.verbose).run()
     else:
-        PylosClient(args.name, (args.host, args.port), verbose=args.verbose)
+        PylosClient(args.name, (args.host, args.port), verbose=args.verbose, hinttime=args.hinttime)
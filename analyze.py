@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# analyze.py
+# Version: October 19, 2026
+# -*- coding: utf-8 -*-
+
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+
+from lib import record
+from pylos import PylosCodec, PylosState, POSITIONS
+
+# Number of games read by a worker for one task
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _movekey(move):
+    key = '{} {}'.format(move['move'], ','.join(map(str, move['to'])))
+    if move['move'] == 'move':
+        key += ' from {}'.format(','.join(map(str, move['from'])))
+    return key
+
+
+def _emptystats():
+    return {
+        'games': 0,
+        'moves': 0,
+        'results': {'0': 0, '1': 0, 'draw': 0},
+        'ontime': 0,
+        'lengths': {},
+        'openings': {},
+        'firstmoves': {},
+        'squares': 0,
+        'removals': {'1': 0, '2': 0},
+        'placed': [0] * len(POSITIONS),
+        'removed': [0] * len(POSITIONS)
+    }
+
+
+# analyze the games [start, stop[ of a log
+def analyzechunk(task):
+    path, start, stop, openingplies = task
+    codec = PylosCodec()
+    stats = _emptystats()
+    for game in record.GameLogReader(path, codec).games(start, stop):
+        result = 'draw' if game.winner is None else str(game.winner)
+        stats['games'] += 1
+        stats['moves'] += len(game.moves)
+        stats['results'][result] += 1
+        if game.ontime:
+            stats['ontime'] += 1
+        length = str(len(game.moves))
+        stats['lengths'][length] = stats['lengths'].get(length, 0) + 1
+        if len(game.moves) >= openingplies:
+            opening = ' / '.join(_movekey(move) for move in game.moves[:openingplies])
+            stats['openings'][opening] = stats['openings'].get(opening, 0) + 1
+        if game.moves:
+            first = stats['firstmoves'].setdefault(_movekey(game.moves[0]), {'0': 0, '1': 0, 'draw': 0})
+            first[result] += 1
+        # replay on a single state, the squares are only visible on the board
+        state = PylosState()
+        for move in game.moves:
+            player = state._state['visible']['turn']
+            state.update(move, player)
+            stats['placed'][codec.position(move['to'])] += 1
+            # update only accepts removals after a completed square, which they may have broken since
+            if 'remove' in move or state.createSquare(move['to']):
+                stats['squares'] += 1
+            if move.get('remove'):
+                stats['removals'][str(len(move['remove']))] += 1
+                for coord in move['remove']:
+                    stats['removed'][codec.position(coord)] += 1
+    return stats
+
+
+def mergestats(total, stats):
+    for name in ('games', 'moves', 'ontime', 'squares'):
+        total[name] += stats[name]
+    for name in ('results', 'removals', 'lengths', 'openings'):
+        for key, value in stats[name].items():
+            total[name][key] = total[name].get(key, 0) + value
+    for key, results in stats['firstmoves'].items():
+        first = total['firstmoves'].setdefault(key, {'0': 0, '1': 0, 'draw': 0})
+        for result, value in results.items():
+            first[result] += value
+    for name in ('placed', 'removed'):
+        total[name] = [a + b for a, b in zip(total[name], stats[name])]
+    return total
+
+
+def tasks(paths, chunksize, openingplies):
+    for path in paths:
+        size = len(record.GameLogReader(path, PylosCodec()))
+        for start in range(0, size, chunksize):
+            yield (path, start, min(start + chunksize, size), openingplies)
+
+
+def _layers(counts):
+    layers = []
+    for layer in range(4):
+        size = 4 - layer
+        layers.append([[0] * size for row in range(size)])
+    for (layer, row, column), value in zip(POSITIONS, counts):
+        layers[layer][row][column] = value
+    return layers
+
+
+# turn the merged counters into the published summary
+def summarize(total, top=20):
+    games = total['games']
+    firstmoves = {}
+    for key, results in sorted(total['firstmoves'].items(), key=lambda item: -sum(item[1].values())):
+        played = sum(results.values())
+        firstmoves[key] = {
+            'games': played,
+            'winrate0': results['0'] / played,
+            'winrate1': results['1'] / played,
+            'drawrate': results['draw'] / played
+        }
+    return {
+        'games': games,
+        'results': total['results'],
+        'ontime': total['ontime'],
+        'averagelength': total['moves'] / games if games else None,
+        'lengths': {key: total['lengths'][key] for key in sorted(total['lengths'], key=int)},
+        'openings': dict(sorted(total['openings'].items(), key=lambda item: -item[1])[:top]),
+        'firstmoves': firstmoves,
+        'squarespermove': total['squares'] / total['moves'] if total['moves'] else None,
+        'squarespergame': total['squares'] / games if games else None,
+        'removals': total['removals'],
+        'hotspots': {'placed': _layers(total['placed']), 'removed': _layers(total['removed'])}
+    }
+
+
+def writecsv(summary, file):
+    writer = csv.writer(file)
+    writer.writerow(['metric', 'key', 'value'])
+    for name in ('games', 'ontime', 'averagelength', 'squarespermove', 'squarespergame'):
+        writer.writerow([name, '', summary[name]])
+    for name in ('results', 'removals', 'lengths', 'openings'):
+        for key, value in summary[name].items():
+            writer.writerow([name, key, value])
+    for key, values in summary['firstmoves'].items():
+        for name, value in values.items():
+            writer.writerow(['firstmoves.' + name, key, value])
+    for name, layers in summary['hotspots'].items():
+        for layer, matrix in enumerate(layers):
+            for row, values in enumerate(matrix):
+                for column, value in enumerate(values):
+                    writer.writerow(['hotspots.' + name, '{},{},{}'.format(layer, row, column), value])
+
+
+def analyze(paths, workers=None, chunksize=DEFAULT_CHUNK_SIZE, openingplies=2):
+    total = _emptystats()
+    with multiprocessing.Pool(workers) as pool:
+        for stats in pool.imap_unordered(analyzechunk, tasks(paths, chunksize, openingplies)):
+            mergestats(total, stats)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analysis of Pylos game logs')
+    parser.add_argument('logs', nargs='+', help='game logs to analyze')
+    parser.add_argument('--workers', help='number of processes (default: number of CPUs)', type=int)
+    parser.add_argument('--chunk', help='number of games per task (default: {})'.format(DEFAULT_CHUNK_SIZE),
+                        type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--plies', help='length of the openings (default: 2)', type=int, default=2)
+    parser.add_argument('--top', help='number of openings reported (default: 20)', type=int, default=20)
+    parser.add_argument('--format', help='output format (default: json)', choices=('json', 'csv'), default='json')
+    parser.add_argument('--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+    summary = summarize(analyze(args.logs, args.workers, args.chunk, args.plies), args.top)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'json':
+            json.dump(summary, output, indent=2)
+            output.write('\n')
+        else:
+            writecsv(summary, output)
+    finally:
+        if args.output:
+            output.close()
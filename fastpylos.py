@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# fastpylos.py
+# Version: October 19, 2026
+# -*- coding: utf-8 -*-
+
+import json
+
+from lib import game
+from pylos import LAYER_OFFSETS, POSITIONS, PylosState
+
+
+def _index(layer, row, column):
+    if layer < 0 or row < 0 or column < 0 or layer > 3 or row > 3 - layer or column > 3 - layer:
+        return None
+    return LAYER_OFFSETS[layer] + row * (4 - layer) + column
+
+
+# The four spheres below each position of the upper layers
+SUPPORTS = [
+    tuple(_index(layer - 1, row + r, column + c) for r, c in ((0, 0), (1, 0), (1, 1), (0, 1))) if layer > 0 else ()
+    for layer, row, column in POSITIONS
+]
+# The (up to four) positions resting on each position
+ABOVE = [
+    tuple(i for i in (_index(layer + 1, row - r, column - c) for r, c in ((0, 0), (1, 0), (1, 1), (0, 1)))
+          if i is not None)
+    for layer, row, column in POSITIONS
+]
+# The 2x2 squares of the same layer a position is part of
+SQUARES_OF = [
+    tuple(
+        square for square in (
+            tuple(_index(layer, row - r + dr, column - c + dc) for dr, dc in ((0, 0), (1, 0), (1, 1), (0, 1)))
+            for r, c in ((0, 0), (1, 0), (1, 1), (0, 1))
+        ) if None not in square
+    )
+    for layer, row, column in POSITIONS
+]
+
+
+class FastPylosState:
+    """Class representing a Pylos state on a flat board, with precomputed neighbourhoods.
+
+    It accepts and rejects the same moves as PylosState.update and leaves the
+    state the same way, even when a move is rejected half-way.
+    """
+
+    def __init__(self, cells=None, reserve=None, turn=0):
+        self.cells = list(cells) if cells is not None else [None] * len(POSITIONS)
+        self.reserve = list(reserve) if reserve is not None else [15, 15]
+        self.turn = turn
+
+    @classmethod
+    def fromstate(cls, state):
+        st = state._state['visible']
+        cells = [cell for layer in st['board'] for row in layer for cell in row]
+        return cls(cells, st['reserve'], st['turn'])
+
+    def tostate(self):
+        board = [[[None] * (4 - layer) for row in range(4 - layer)] for layer in range(4)]
+        for (layer, row, column), cell in zip(POSITIONS, self.cells):
+            board[layer][row][column] = cell
+        return PylosState({'board': board, 'reserve': list(self.reserve), 'turn': self.turn})
+
+    def visible(self):
+        return self.tostate()._state['visible']
+
+    def __str__(self):
+        return json.dumps(self.visible(), separators=(',', ':'))
+
+    def key(self):
+        return tuple(self.cells) + (self.turn,)
+
+    def __position(self, coord):
+        layer, row, column = tuple(coord)
+        i = _index(layer, row, column)
+        if i is None:
+            raise game.InvalidMoveException('The position ({}) is outside of the board'.format([layer, row, column]))
+        return i
+
+    def __set(self, coord, value):
+        i = self.__position(coord)
+        cells = self.cells
+        if cells[i] is not None:
+            raise game.InvalidMoveException('The position ({}) is not free'.format(list(coord)))
+        for j in SUPPORTS[i]:
+            if cells[j] is None:
+                raise game.InvalidMoveException('The position ({}) is not stable'.format(list(coord)))
+        cells[i] = value
+        return i
+
+    def __remove(self, coord, player):
+        i = self.__position(coord)
+        cells = self.cells
+        if cells[i] is None:
+            raise game.InvalidMoveException('The position ({}) is empty'.format(list(coord)))
+        for j in ABOVE[i]:
+            if cells[j] is not None:
+                raise game.InvalidMoveException('The position ({}) is not movable'.format(list(coord)))
+        if cells[i] != player:
+            raise game.InvalidMoveException('not your sphere')
+        cells[i] = None
+        return i
+
+    def square(self, i):
+        cells = self.cells
+        for a, b, c, d in SQUARES_OF[i]:
+            if cells[a] is not None and cells[a] == cells[b] == cells[c] == cells[d]:
+                return True
+        return False
+
+    def update(self, move, player):
+        if move['move'] == 'place':
+            if self.reserve[player] < 1:
+                raise game.InvalidMoveException('no more sphere')
+            to = self.__set(move['to'], player)
+            self.reserve[player] -= 1
+        elif move['move'] == 'move':
+            if move['to'][0] <= move['from'][0]:
+                raise game.InvalidMoveException('you can only move to upper layer')
+            source = self.__remove(move['from'], player)
+            try:
+                to = self.__set(move['to'], player)
+            except game.InvalidMoveException:
+                self.cells[source] = player
+                raise
+        else:
+            raise game.InvalidMoveException('Invalid Move:\n{}'.format(move))
+
+        if 'remove' in move:
+            if not self.square(to):
+                raise game.InvalidMoveException('You cannot remove spheres')
+            if len(move['remove']) > 2:
+                raise game.InvalidMoveException('Can\'t remove more than 2 spheres')
+            for coord in move['remove']:
+                self.__remove(coord, player)
+                self.reserve[player] += 1
+
+        self.turn = (self.turn + 1) % 2
+
+    def winner(self):
+        if self.reserve[0] < 1:
+            return 1
+        elif self.reserve[1] < 1:
+            return 0
+        return -1
+
+    def __free(self, i):
+        cells = self.cells
+        for j in ABOVE[i]:
+            if cells[j] is not None:
+                return False
+        return True
+
+    def moves(self):
+        cells = self.cells
+        player = self.turn
+        free = [
+            i for i in range(len(cells))
+            if cells[i] is None and all(cells[j] is not None for j in SUPPORTS[i])
+        ]
+        movable = [i for i in range(len(cells)) if cells[i] == player and self.__free(i)]
+        moves = []
+        for to in free:
+            if self.reserve[player] > 0:
+                moves.append((to, None))
+            for source in movable:
+                if POSITIONS[source][0] < POSITIONS[to][0] and source not in SUPPORTS[to]:
+                    moves.append((to, source))
+        result = []
+        for to, source in moves:
+            move = {'move': 'place', 'to': list(POSITIONS[to])} if source is None else \
+                {'move': 'move', 'from': list(POSITIONS[source]), 'to': list(POSITIONS[to])}
+            result.append(move)
+            if source is not None:
+                cells[source] = None
+            cells[to] = player
+            if self.square(to):
+                seen = set()
+                for first in range(len(cells)):
+                    if cells[first] == player and self.__free(first):
+                        result.append(dict(move, remove=[list(POSITIONS[first])]))
+                        cells[first] = None
+                        for second in range(len(cells)):
+                            if cells[second] == player and self.__free(second):
+                                pair = frozenset((first, second))
+                                if pair not in seen:
+                                    seen.add(pair)
+                                    result.append(dict(move, remove=[list(POSITIONS[first]), list(POSITIONS[second])]))
+                        cells[first] = player
+            cells[to] = None
+            if source is not None:
+                cells[source] = player
+        return result
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# fuzz.py
+# Version: October 19, 2026
+# -*- coding: utf-8 -*-
+
+import argparse
+import copy
+import importlib
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+from lib import game
+from pylos import PylosState
+
+DEFAULT_CANDIDATE = 'fastpylos:FastPylosState'
+# Probability that a generated move is one of the valid moves
+LEGAL_RATE = 0.7
+# Probability that the valid moves of both implementations are compared at a step
+MOVES_CHECK_RATE = 0.1
+
+
+def loadcandidate(name):
+    module, cls = name.split(':')
+    return getattr(importlib.import_module(module), cls)
+
+
+def _coord(rng):
+    # mostly on the board, sometimes just outside of it
+    return [rng.randint(-1, 4), rng.randint(-1, 4), rng.randint(-1, 4)] if rng.random() < 0.2 else \
+        [rng.randint(0, 3), rng.randint(0, 3), rng.randint(0, 3)]
+
+
+def randommove(rng, state):
+    '''Return a move for 'state': a valid one, a corrupted valid one or a random one, and the player making it.'''
+    player = state._state['visible']['turn']
+    if rng.random() < 0.05:
+        player = (player + 1) % 2
+    if rng.random() < LEGAL_RATE:
+        moves = state.moves()
+        if moves:
+            move = copy.deepcopy(rng.choice(moves))
+            if rng.random() < 0.2:
+                # break it a little
+                which = rng.choice([key for key in ('to', 'from', 'remove') if key in move])
+                if which == 'remove':
+                    move['remove'].append(_coord(rng))
+                else:
+                    move[which] = _coord(rng)
+            return move, player
+    move = {'move': rng.choice(('place', 'place', 'move', 'jump')), 'to': _coord(rng)}
+    if move['move'] == 'move':
+        move['from'] = _coord(rng)
+    if rng.random() < 0.2:
+        move['remove'] = [_coord(rng) for i in range(rng.randint(0, 3))]
+    return move, player
+
+
+def _outcome(state, move, player):
+    try:
+        state.update(copy.deepcopy(move), player)
+        return 'accepted'
+    except game.InvalidMoveException:
+        return 'rejected'
+    except Exception as e:
+        return 'error {}'.format(type(e).__name__)
+
+
+def _movekeys(moves):
+    keys = set()
+    for move in moves:
+        move = dict(move)
+        if 'remove' in move:
+            move['remove'] = sorted(move['remove'])
+        keys.add(json.dumps(move, sort_keys=True))
+    return keys
+
+
+def divergence(sequence, candidateclass, checkmoves=1.0, rng=None):
+    '''Replay a sequence of (move, player) on both implementations.
+
+    Pre: -
+    Post: The returned value is None if both implementations agree on the whole
+          sequence, or else (index of the first step where they differ, description).
+    '''
+    reference = PylosState()
+    candidate = candidateclass()
+    for i, (move, player) in enumerate(sequence):
+        if checkmoves >= 1 or (rng is not None and rng.random() < checkmoves):
+            if _movekeys(reference.moves()) != _movekeys(candidate.moves()):
+                return i, 'different valid moves'
+        expected = _outcome(reference, move, player)
+        got = _outcome(candidate, move, player)
+        if expected != got:
+            return i, 'move {} by the reference, {} by the candidate'.format(expected, got)
+        if reference._state['visible'] != candidate.visible():
+            return i, 'different states after the move'
+    return None
+
+
+def shrink(sequence, candidateclass):
+    '''Return a minimal subsequence of 'sequence' on which the implementations still differ.'''
+    def fails(candidate):
+        return divergence(candidate, candidateclass) is not None
+
+    # cut the tail after the first divergence
+    sequence = sequence[:divergence(sequence, candidateclass)[0] + 1]
+    # remove chunks of moves, from the largest to single moves
+    size = len(sequence) // 2
+    while size >= 1:
+        i = 0
+        while i < len(sequence):
+            candidate = sequence[:i] + sequence[i + size:]
+            if candidate and fails(candidate):
+                sequence = candidate
+            else:
+                i += size
+        size //= 2
+    # simplify the removals of the remaining moves
+    for i in range(len(sequence)):
+        move, player = sequence[i]
+        if 'remove' in move:
+            simpler = [dict((key, value) for key, value in move.items() if key != 'remove')]
+            simpler += [dict(move, remove=move['remove'][:j] + move['remove'][j + 1:]) for j in range(len(move['remove']))]
+            for candidate in simpler:
+                if fails(sequence[:i] + [(candidate, player)] + sequence[i + 1:]):
+                    sequence[i] = (candidate, player)
+                    break
+    return sequence
+
+
+# play random sequences and return the number of steps played and a minimal divergence (or None)
+def fuzzworker(task):
+    seed, nbsequences, length, candidatename, checkmoves = task
+    candidateclass = loadcandidate(candidatename)
+    rng = random.Random(seed)
+    steps = 0
+    for n in range(nbsequences):
+        reference = PylosState()
+        candidate = candidateclass()
+        sequence = []
+        for i in range(length):
+            move, player = randommove(rng, reference)
+            sequence.append((move, player))
+            steps += 1
+            checked = rng.random() < checkmoves
+            if checked and _movekeys(reference.moves()) != _movekeys(candidate.moves()):
+                return steps, shrink(sequence, candidateclass)
+            expected = _outcome(reference, move, player)
+            if expected != _outcome(candidate, move, player) or reference._state['visible'] != candidate.visible():
+                return steps, shrink(sequence, candidateclass)
+            if reference.winner() != -1:
+                break
+    return steps, None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Differential fuzzing of a Pylos state against PylosState')
+    parser.add_argument('--candidate', help='implementation to check as module:Class (default: {})'.format(DEFAULT_CANDIDATE),
+                        default=DEFAULT_CANDIDATE)
+    parser.add_argument('--sequences', help='number of sequences (default: 10000)', type=int, default=10000)
+    parser.add_argument('--length', help='maximum number of moves of a sequence (default: 80)', type=int, default=80)
+    parser.add_argument('--chunk', help='number of sequences per task (default: 100)', type=int, default=100)
+    parser.add_argument('--workers', help='number of processes (default: number of CPUs)', type=int)
+    parser.add_argument('--seed', help='seed of the first task (default: 0)', type=int, default=0)
+    parser.add_argument('--check-moves', help='rate of the steps where the valid moves are compared (default: {})'
+                        .format(MOVES_CHECK_RATE), type=float, default=MOVES_CHECK_RATE, dest='checkmoves')
+    args = parser.parse_args()
+    tasks = [
+        (args.seed + i, min(args.chunk, args.sequences - i * args.chunk), args.length, args.candidate, args.checkmoves)
+        for i in range((args.sequences + args.chunk - 1) // args.chunk)
+    ]
+    start = time.perf_counter()
+    steps = 0
+    found = None
+    with multiprocessing.Pool(args.workers) as pool:
+        for played, sequence in pool.imap_unordered(fuzzworker, tasks):
+            steps += played
+            if sequence is not None:
+                found = sequence
+                pool.terminate()
+                break
+    elapsed = time.perf_counter() - start
+    print('{} moves in {:.1f}s ({:.0f} moves/s)'.format(steps, elapsed, steps / elapsed if elapsed > 0 else 0))
+    if found is not None:
+        index, reason = divergence(found, loadcandidate(args.candidate))
+        print('Divergence ({}) after {} moves:'.format(reason, len(found)))
+        for move, player in found:
+            print(' player {}: {}'.format(player, json.dumps(move)))
+        sys.exit(1)
+    print('No divergence found.')
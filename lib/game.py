@@ -7,9 +7,14 @@ import copy
 import json
 import socket
 import sys
+import time
 
 DEFAULT_BUFFER_SIZE = 1024
 SECTION_WIDTH = 60
+# Milliseconds kept aside by the clients for the network and the parsing
+TIME_MARGIN = 50
+# Seconds a player of a match has to acknowledge a result or the start of a game
+HANDSHAKE_TIMEOUT = 10
 
 
 def _printsection(title):
@@ -23,6 +28,64 @@ class InvalidMoveException(Exception):
         super().__init__(message)
 
 
+class TimeControl:
+    '''Class representing the time control of a game (durations in seconds, None for unlimited).
+
+    Each move must be played within 'movetime' and the thinking time of a
+    player is taken from its 'clock', which gains 'increment' after each
+    valid move. A player running out of time loses the game.
+    '''
+    def __init__(self, movetime=None, clock=None, increment=0):
+        if (movetime is not None and movetime <= 0) or (clock is not None and clock <= 0):
+            raise ValueError('the move time and the clock must be positive')
+        if increment < 0:
+            raise ValueError('the increment can not be negative')
+        self.movetime = movetime
+        self.clock = clock
+        self.increment = increment
+
+    def limit(self, clock):
+        '''Return the time (in seconds) a player with the specified 'clock' has to play, or None if unlimited.'''
+        limits = [t for t in (self.movetime, clock) if t is not None]
+        return max(min(limits), 0) if limits else None
+
+    def header(self, clock):
+        '''Return the time information sent with PLAY: clock, move time and increment in milliseconds (-1 for unlimited).'''
+        def ms(t):
+            return -1 if t is None else int(max(t, 0) * 1000)
+        return '{} {} {}'.format(ms(clock), ms(self.movetime), ms(self.increment))
+
+
+class TimeManager:
+    '''Class helping a client to decide how long to think (durations in milliseconds, None for unlimited).'''
+    def __init__(self, clock=None, movetime=None, increment=0):
+        self.clock = clock
+        self.movetime = movetime
+        self.increment = increment
+
+    @classmethod
+    def parse(cls, header):
+        clock, movetime, increment = (int(t) for t in header.split(' '))
+        return cls(None if clock < 0 else clock, None if movetime < 0 else movetime, max(increment, 0))
+
+    def budget(self, movestogo=20, default=1000, margin=TIME_MARGIN):
+        '''Compute the thinking time of the next move.
+
+        Pre: movestogo is an estimate of the number of moves the player still has to play.
+        Post: The returned value is the number of milliseconds to spend on the move,
+              'default' if the time is unlimited.
+        '''
+        budgets = []
+        if self.clock is not None:
+            share = self.clock / max(movestogo, 1) + self.increment * 3 / 4
+            budgets.append(min(share, self.clock - margin))
+        if self.movetime is not None:
+            budgets.append(self.movetime - margin)
+        if not budgets:
+            return default
+        return max(min(budgets), 1)
+
+
 class GameState(metaclass=ABCMeta):
     '''Abstract class representing a generic game state.'''
     def __init__(self, visible, hidden=None):
@@ -65,14 +128,24 @@ class GameState(metaclass=ABCMeta):
 
 class GameServer(metaclass=ABCMeta):
     '''Abstract class representing a generic game server.'''
-    def __init__(self, name, nbplayers, initialstate, verbose=False):
+    def __init__(self, name, nbplayers, initialstate, verbose=False, metrics=None, timecontrol=None, record=None,
+                 nbgames=1, spectators=None):
         self.__name = name
         self.__nbplayers = nbplayers
         self.__verbose = verbose
+        self.__metrics = metrics
+        self.__timecontrol = timecontrol
+        self.__record = record
+        self.__nbgames = nbgames
+        self.__spectators = spectators
+        self.__initialstate = copy.deepcopy(initialstate)
         self._state = initialstate
         # Stats about the running game
         self.__currentplayer = None
         self.__turns = 0
+        self.__clocks = [timecontrol.clock if timecontrol is not None else None] * nbplayers
+        # Stats about the match, for each connection (in the order they were accepted)
+        self.__results = [{'won': 0, 'lost': 0, 'draw': 0} for i in range(nbplayers)]
 
     @property
     def name(self):
@@ -90,6 +163,26 @@ class GameServer(metaclass=ABCMeta):
     def turns(self):
         return self.__turns
 
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    @property
+    def timecontrol(self):
+        return self.__timecontrol
+
+    @property
+    def clocks(self):
+        return list(self.__clocks)
+
+    @property
+    def nbgames(self):
+        return self.__nbgames
+
+    @property
+    def results(self):
+        return copy.deepcopy(self.__results)
+
     @abstractmethod
     def applymove(self, move):
         '''Apply a move.
@@ -116,29 +209,43 @@ class GameServer(metaclass=ABCMeta):
             except:
                 print(' Game server listening on port {}.'.format(5000))
             print(' Waiting for {} players...'.format(self.nbplayers))
-        self.__players = []
+        self.__connections = []
         # Wait for enough players for a play
         try:
-            while len(self.__players) < self.__nbplayers:
+            while len(self.__connections) < self.__nbplayers:
                 client = s.accept()[0]
-                self.__players.append(client)
+                self.__connections.append(client)
                 if self.__verbose:
                     print(' - Client connected from {}:{} ({}/{}).'
-                          .format(*client.getpeername(), len(self.__players), self.nbplayers)
+                          .format(*client.getpeername(), len(self.__connections), self.nbplayers)
                           )
         except KeyboardInterrupt:
-            for player in self.__players:
+            for player in self.__connections:
                 player.close()
             _printsection('Game server ended')
             return False
+        return True
+
+    def _startgame(self, game):
+        # The players take turns to start the games of a match
+        self.__players = [self.__connections[(i + game) % self.nbplayers] for i in range(self.nbplayers)]
+        if game > 0:
+            self._state = copy.deepcopy(self.__initialstate)
+            self.__turns = 0
         # Notify players that the game started
         try:
             for i in range(len(self.__players)):
                 if self.__verbose:
                     print(' Initialising player {}...'.format(i))
                 player = self.__players[i]
-                player.sendall('START {}'.format(i).encode())
+                player.settimeout(HANDSHAKE_TIMEOUT)
+                if self.__nbgames > 1:
+                    player.sendall('START {} {} {}'.format(i, game, self.__nbgames).encode())
+                else:
+                    player.sendall('START {}'.format(i).encode())
                 data = player.recv(self._state.__class__.buffersize()).decode().split(' ')
+                # Without time control, a player may think as long as it wants
+                player.settimeout(None)
                 if data[0] != 'READY':
                     if self.__verbose:
                         print(' - Player {} not ready to start.'.format(i))
@@ -153,28 +260,122 @@ class GameServer(metaclass=ABCMeta):
         # Start the game since all the players are ready
         if self.__verbose:
             _printsection('Game initialised (all players ready to start)')
+        if self.__spectators is not None:
+            self.__spectators.publish('start', game=game, state=str(self._state))
         return True
 
+    def _waitdone(self):
+        '''Wait for each player to acknowledge its result before the next game of a match.
+
+        Pre: -
+        Post: The returned value is the list of the connections (numbered in the order
+              they were accepted) that did not send DONE within HANDSHAKE_TIMEOUT.
+        '''
+        forfeits = []
+        for i, player in enumerate(self.__connections):
+            deadline = time.perf_counter() + HANDSHAKE_TIMEOUT
+            data = ''
+            try:
+                # Drop what a player who ran out of time sent too late
+                while not data.endswith('DONE'):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise socket.timeout()
+                    player.settimeout(remaining)
+                    received = player.recv(self._state.__class__.buffersize()).decode()
+                    if received == '':
+                        raise ConnectionError()
+                    data += received
+            except OSError:
+                if self.__verbose:
+                    print(' Client {} did not acknowledge the end of the game.'.format(i))
+                forfeits.append(i)
+        return forfeits
+
+    def _forfeit(self, forfeits, nbgames):
+        # The remaining games of the match are lost by the connections that forfeit
+        for i in range(self.nbplayers):
+            if i in forfeits:
+                result = 'lost'
+            else:
+                result = 'won' if self.nbplayers == 2 else 'draw'
+            self.__results[i][result] += nbgames
+        if self.__verbose:
+            print(' Client(s) {} forfeit the last {} game(s).'.format(', '.join(map(str, forfeits)), nbgames))
+
     def _gameloop(self):
         self.__currentplayer = 0
         winner = -1
+        timedout = None
         if self.__verbose:
             print(' Initial state:')
             self._state.prettyprint()
+        metrics = self.__metrics
+        timecontrol = self.__timecontrol
+        self.__clocks = [timecontrol.clock if timecontrol is not None else None] * self.nbplayers
+        moves = []
         # Loop until the game ends with a winner or with a draw
         while winner == -1:
-            player = self.__players[self.__currentplayer]
+            current = self.__currentplayer
+            player = self.__players[current]
             if self.__verbose:
-                print("\n=> Turn #{} (player {})".format(self.turns, self.__currentplayer))
-            player.sendall('PLAY {}'.format(self.state).encode())
+                print("\n=> Turn #{} (player {})".format(self.turns, current))
+            if metrics is not None:
+                turnstart = start = metrics.timer()
+            if timecontrol is not None:
+                clock = self.__clocks[current]
+                data = 'PLAY {} {}'.format(timecontrol.header(clock), self.state).encode()
+            else:
+                data = 'PLAY {}'.format(self.state).encode()
+            if metrics is not None:
+                start = metrics.since('serialize', start, current)
+            player.sendall(data)
+            if metrics is not None:
+                start = metrics.since('send', start, current)
             try:
+                if timecontrol is not None:
+                    limit = timecontrol.limit(clock)
+                    if limit == 0:
+                        # a timeout of 0 would make the socket non-blocking
+                        raise socket.timeout()
+                    player.settimeout(limit)
+                    sent = time.perf_counter()
                 move = player.recv(self._state.__class__.buffersize()).decode()
+                # Waiting for the move covers the thinking time and the network latency
+                if metrics is not None:
+                    start = metrics.since('think', start, current)
+                if timecontrol is not None:
+                    elapsed = time.perf_counter() - sent
+                    if clock is not None:
+                        self.__clocks[current] = clock = clock - elapsed
+                    if timecontrol.limit(clock) == 0 or (timecontrol.movetime is not None and elapsed > timecontrol.movetime):
+                        raise socket.timeout()
                 if self.__verbose:
                     print('   Move:', move)
                 self.applymove(move)
+                moves.append(move)
+                if self.__spectators is not None:
+                    self.__spectators.publish('turn', turn=self.turns, player=current, move=move, state=str(self._state))
+                if metrics is not None:
+                    metrics.since('validate', start, current)
+                    metrics.since('turn', turnstart, current)
+                if timecontrol is not None and clock is not None:
+                    self.__clocks[current] += timecontrol.increment
                 self.__turns += 1
                 self.__currentplayer = (self.__currentplayer + 1) % self.nbplayers
+            except socket.timeout:
+                if metrics is not None:
+                    metrics.count('timeout', current)
+                if self.__verbose:
+                    print('Player {} ran out of time.'.format(current))
+                timedout = current
+                break
             except InvalidMoveException as e:
+                if metrics is not None:
+                    metrics.since('validate', start, current)
+                    metrics.count('invalid', current)
+                if self.__spectators is not None:
+                    self.__spectators.publish('invalid', player=current, move=move, error=str(e))
                 if self.__verbose:
                     print('Invalid move:', e)
                 player.sendall('ERROR {}'.format(e).encode())
@@ -184,8 +385,21 @@ class GameServer(metaclass=ABCMeta):
             winner = self._state.winner()
         if self.__verbose:
             _printsection('Game finished')
-        # Notify players about won/lost status
-        if winner is not None:
+        # Notify players about won/lost status, a player running out of time loses
+        if timedout is not None:
+            for i in range(self.nbplayers):
+                if i == timedout:
+                    result = 'LOST'
+                else:
+                    result = 'WON' if self.nbplayers == 2 else 'END'
+                try:
+                    self.__players[i].sendall(result.encode())
+                except OSError:
+                    pass
+            if self.__verbose:
+                print(' Player {} lost on time.'.format(timedout))
+            winner = (timedout + 1) % 2 if self.nbplayers == 2 else None
+        elif winner is not None:
             for i in range(self.nbplayers):
                 self.__players[i].sendall(('WON' if winner == i else 'LOST').encode())
             if self.__verbose:
@@ -194,15 +408,38 @@ class GameServer(metaclass=ABCMeta):
         else:
             for player in self.__players:
                 player.sendall('END'.encode())
-        # Close the connexions with the clients
-        for player in self.__players:
-            player.close()
+        if self.__record is not None:
+            self.__record.append(moves, winner, timedout is not None)
+        if self.__spectators is not None:
+            self.__spectators.publish('end', winner=winner, ontime=timedout is not None)
         if self.__verbose:
             _printsection('Game ended')
+        return winner
 
     def run(self):
-        if self._waitplayers():
-            self._gameloop()
+        if not self._waitplayers():
+            return
+        for game in range(self.__nbgames):
+            if game > 0:
+                forfeits = self._waitdone()
+                if forfeits:
+                    self._forfeit(forfeits, self.__nbgames - game)
+                    break
+            if not self._startgame(game):
+                break
+            winner = self._gameloop()
+            for i in range(self.nbplayers):
+                # the connection i played as player (i - game) in this game
+                seat = (i - game) % self.nbplayers
+                result = 'draw' if winner is None else 'won' if winner == seat else 'lost'
+                self.__results[i][result] += 1
+        if self.__verbose and self.__nbgames > 1:
+            _printsection('Match ended')
+            for i, result in enumerate(self.__results):
+                print(' Client {}: {won} won, {lost} lost, {draw} draw.'.format(i, **result))
+        # Close the connexions with the clients
+        for player in self.__connections:
+            player.close()
 
 
 class GameClient(metaclass=ABCMeta):
@@ -210,6 +447,11 @@ class GameClient(metaclass=ABCMeta):
     def __init__(self, server, stateclass, verbose=False):
         self.__stateclass = stateclass
         self.__verbose = verbose
+        self._timemanager = None
+        # Results of the games played on this connection
+        self._results = {'WON': 0, 'LOST': 0, 'END': 0}
+        self.__game = 0
+        self.__nbgames = 1
         if self.__verbose:
             _printsection('Starting game')
         addrinfos = socket.getaddrinfo(*server, socket.AF_INET, socket.SOCK_STREAM)
@@ -228,15 +470,31 @@ class GameClient(metaclass=ABCMeta):
         running = True
         while running:
             data = server.recv(self.__stateclass.buffersize()).decode()
+            if data == '':
+                # The server closed the connexion
+                server.close()
+                break
             command = data[:data.index(' ')] if ' ' in data else data
             if command == 'START':
-                self._playernb = int(data[data.index(' '):])
+                # In a match, START also gives the number of the game and the number of games
+                fields = data.split(' ')
+                self._playernb = int(fields[1])
+                if len(fields) == 4:
+                    self.__game, self.__nbgames = int(fields[2]), int(fields[3])
                 server.sendall('READY'.encode())
                 if self.__verbose:
                     _printsection('Game started')
                     print("   Player's number: {}".format(self._playernb))
             elif command == 'PLAY':
-                state = self.__stateclass.parse(data[data.index(' ')+1:])
+                data = data[data.index(' ')+1:]
+                # With a time control, the state comes after the clock, the move time and the increment
+                fields = data.split(' ', 3)
+                if len(fields) == 4 and all(field.lstrip('-').isdigit() for field in fields[:3]):
+                    self._timemanager = TimeManager.parse(' '.join(fields[:3]))
+                    data = fields[3]
+                else:
+                    self._timemanager = None
+                state = self.__stateclass.parse(data)
                 if self.__verbose:
                     print("\n=> Player's turn to play")
                     print('   State:')
@@ -246,7 +504,8 @@ class GameClient(metaclass=ABCMeta):
                     print('   Move:', move)
                 server.sendall(move.encode())
             elif command in ('WON', 'LOST', 'END'):
-                running = False
+                self._results[command] += 1
+                self._gameended(command)
                 if self.__verbose:
                     _printsection('Game finished')
                     if command == 'WON':
@@ -256,7 +515,15 @@ class GameClient(metaclass=ABCMeta):
                     else:
                         print(' It is draw.')
                     _printsection('Game ended')
-                server.close()
+                # The connexion stays open for the next game of a match
+                if self.__game < self.__nbgames - 1:
+                    server.sendall('DONE'.encode())
+                else:
+                    running = False
+                    if self.__verbose and self.__nbgames > 1:
+                        _printsection('Match ended')
+                        print(' {WON} won, {LOST} lost, {END} draw.'.format(**self._results))
+                    server.close()
             else:
                 if self.__verbose:
                     print('Specific data received:', data)
@@ -271,6 +538,14 @@ class GameClient(metaclass=ABCMeta):
         '''
         ...
 
+    def _gameended(self, result):
+        '''Called when the game is finished.
+
+        Pre: result in ('WON', 'LOST', 'END')
+        Post: The end of the game has been handled (nothing is done by default).
+        '''
+        pass
+
     @abstractmethod
     def _nextmove(self, state):
         '''Get the next move to play.
@@ -0,0 +1,142 @@
+# metrics.py
+# Version: October 19, 2026
+
+import json
+import time
+
+# Upper bounds (in milliseconds) of the histogram buckets, the last bucket catches everything else
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    '''Class representing a latency histogram with fixed buckets (in milliseconds).'''
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.__buckets = tuple(buckets)
+        self.__counts = [0] * (len(self.__buckets) + 1)
+        self.__count = 0
+        self.__total = 0.0
+        self.__min = None
+        self.__max = None
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def total(self):
+        return self.__total
+
+    def observe(self, ms):
+        '''Record a value.
+
+        Pre: ms >= 0
+        Post: The value 'ms' has been added to this histogram.
+        '''
+        i = 0
+        while i < len(self.__buckets) and ms > self.__buckets[i]:
+            i += 1
+        self.__counts[i] += 1
+        self.__count += 1
+        self.__total += ms
+        if self.__min is None or ms < self.__min:
+            self.__min = ms
+        if self.__max is None or ms > self.__max:
+            self.__max = ms
+
+    def quantile(self, q):
+        '''Estimate a quantile from the buckets.
+
+        Pre: 0 <= q <= 1
+        Post: The returned value is the upper bound of the bucket containing the
+              q-quantile (the maximum for the overflow bucket), or None if empty.
+        '''
+        if self.__count == 0:
+            return None
+        rank = q * self.__count
+        seen = 0
+        for i, n in enumerate(self.__counts):
+            seen += n
+            if seen >= rank and n > 0:
+                return self.__buckets[i] if i < len(self.__buckets) else self.__max
+        return self.__max
+
+    def todict(self):
+        return {
+            'count': self.__count,
+            'total': self.__total,
+            'mean': self.__total / self.__count if self.__count else None,
+            'min': self.__min,
+            'max': self.__max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': list(self.__buckets) + ['+Inf'],
+            'counts': list(self.__counts)
+        }
+
+
+class GameMetrics:
+    '''Class collecting per-turn timings and counters of a game server.
+
+    Timings are grouped by name ('think', 'validate', 'serialize', 'send'...)
+    and by player; counters ('invalid'...) likewise.
+    '''
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.__buckets = buckets
+        self.__histograms = {}
+        self.__counters = {}
+
+    def observe(self, name, seconds, player=None):
+        '''Record a duration.
+
+        Pre: seconds >= 0
+        Post: The duration has been added (in milliseconds) to the 'name'
+              histogram of the specified player (or of the game if None).
+        '''
+        key = (name, player)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            histogram = self.__histograms[key] = Histogram(self.__buckets)
+        histogram.observe(seconds * 1000)
+
+    def timer(self):
+        return time.perf_counter()
+
+    def since(self, name, start, player=None):
+        '''Record the time elapsed since 'start' (obtained with timer) and return the current time.'''
+        now = time.perf_counter()
+        self.observe(name, now - start, player)
+        return now
+
+    def count(self, name, player=None, value=1):
+        key = (name, player)
+        self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def histogram(self, name, player=None):
+        return self.__histograms.get((name, player))
+
+    def counter(self, name, player=None):
+        return self.__counters.get((name, player), 0)
+
+    def todict(self):
+        def group(items):
+            result = {}
+            for (name, player), value in sorted(items, key=lambda item: (item[0][0], str(item[0][1]))):
+                result.setdefault(name, {})['all' if player is None else str(player)] = value
+            return result
+        return {
+            'histograms': group((key, h.todict()) for key, h in self.__histograms.items()),
+            'counters': group(self.__counters.items())
+        }
+
+    def dump(self, file):
+        '''Write the metrics as JSON.
+
+        Pre: 'file' is a path or a writable text file object.
+        Post: The metrics have been written to 'file'.
+        '''
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                json.dump(self.todict(), f, indent=2)
+        else:
+            json.dump(self.todict(), file, indent=2)
@@ -0,0 +1,256 @@
+# record.py
+# Version: October 19, 2026
+
+from abc import *
+import copy
+import os
+import struct
+import zlib
+
+MAGIC = b'GLOG\x01'
+# Record header: payload length, payload CRC32, result, flags and number of moves
+HEADER = struct.Struct('<IIBBH')
+# Index entry: offset of a record in the log
+OFFSET = struct.Struct('<Q')
+DRAW = 0xFF
+# Flags of a record
+ON_TIME = 1
+READ_BUFFER_SIZE = 1 << 16
+
+
+class CorruptedLogException(Exception):
+    '''Exception representing a game log that can not be read.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class RecordCodec(metaclass=ABCMeta):
+    '''Abstract class representing how the moves of a game are stored and replayed.'''
+    @abstractmethod
+    def encode(self, move):
+        '''Encode a move.
+
+        Pre: 'move' is a valid move.
+        Post: The returned value is the bytes representing 'move'.
+        '''
+        ...
+
+    @abstractmethod
+    def decode(self, data, offset):
+        '''Decode a move.
+
+        Pre: A move encoded with 'encode' starts at 'offset' in 'data'.
+        Post: The returned value is the pair (move, offset of the next move).
+        '''
+        ...
+
+    @abstractmethod
+    def initialstate(self):
+        '''Return the state in which the recorded games start.'''
+        ...
+
+    @abstractmethod
+    def apply(self, state, move):
+        '''Apply a recorded move on 'state' for the player to play.'''
+        ...
+
+
+class GameRecord:
+    '''Class representing a recorded game: its moves and its result.
+
+    The winner is None for a draw; 'ontime' tells whether the game ended
+    because a player ran out of time.
+    '''
+    def __init__(self, moves, winner, ontime=False):
+        self.moves = moves
+        self.winner = winner
+        self.ontime = ontime
+
+
+class GameLog:
+    '''Class representing an append-only log of games with its index.
+
+    The log ('path') is a sequence of records (header, CRC32 and encoded
+    moves) and the index ('path.idx') holds the offset of each record, so
+    that both files only grow and a game can be found without reading the
+    ones before it.
+    '''
+    def __init__(self, path, codec):
+        self.__codec = codec
+        if os.path.exists(path):
+            self.__recover(path)
+        self.__log = open(path, 'ab')
+        self.__index = open(path + '.idx', 'ab')
+        if self.__log.tell() == 0:
+            self.__log.write(MAGIC)
+            self.__log.flush()
+
+    def __recover(self, path):
+        '''Drop what an interrupted append left after the last complete game and index the games missing from the index.'''
+        indexpath = path + '.idx'
+        indexsize = os.path.getsize(indexpath) if os.path.exists(indexpath) else 0
+        indexsize -= indexsize % OFFSET.size
+        end = len(MAGIC)
+        with open(path, 'r+b', buffering=READ_BUFFER_SIZE) as log:
+            magic = log.read(len(MAGIC))
+            if magic != MAGIC:
+                if not MAGIC.startswith(magic):
+                    raise CorruptedLogException('{} is not a game log'.format(path))
+                # the log was interrupted before its first game, start it again
+                log.seek(0)
+                log.truncate()
+                log.write(MAGIC)
+                with open(indexpath, 'wb'):
+                    pass
+                return
+            # the last indexed game that is complete
+            while indexsize > 0:
+                with open(indexpath, 'rb') as index:
+                    index.seek(indexsize - OFFSET.size)
+                    offset = OFFSET.unpack(index.read(OFFSET.size))[0]
+                log.seek(offset)
+                header = log.read(HEADER.size)
+                if len(header) == HEADER.size:
+                    length = HEADER.unpack(header)[0]
+                    if len(log.read(length)) == length:
+                        end = offset + HEADER.size + length
+                        break
+                indexsize -= OFFSET.size
+            # the complete games written after it, whose offsets did not reach the index
+            offsets = []
+            log.seek(end)
+            while True:
+                header = log.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, crc = HEADER.unpack(header)[:2]
+                payload = log.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                offsets.append(end)
+                end += HEADER.size + length
+            log.truncate(end)
+        with open(indexpath, 'ab') as index:
+            index.truncate(indexsize)
+            index.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+
+    def append(self, moves, winner, ontime=False):
+        '''Append a finished game.
+
+        Pre: 'moves' are the moves of the game, 'winner' its winner (None for a draw).
+        Post: The game has been written at the end of the log and of the index.
+        '''
+        payload = b''.join(self.__codec.encode(move) for move in moves)
+        result = DRAW if winner is None else winner
+        header = HEADER.pack(len(payload), zlib.crc32(payload), result, ON_TIME if ontime else 0, len(moves))
+        offset = self.__log.tell()
+        self.__log.write(header + payload)
+        self.__log.flush()
+        self.__index.write(OFFSET.pack(offset))
+        self.__index.flush()
+
+    def close(self):
+        self.__log.close()
+        self.__index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GameLogReader:
+    '''Class reading a game log one game at a time.'''
+    def __init__(self, path, codec):
+        self.__path = path
+        self.__codec = codec
+
+    @property
+    def codec(self):
+        return self.__codec
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.__path + '.idx') // OFFSET.size
+        except OSError:
+            return 0
+
+    def __read(self, file):
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            # A partial header is a game whose writing was interrupted
+            return None
+        length, crc, result, flags, nbmoves = HEADER.unpack(header)
+        payload = file.read(length)
+        if len(payload) < length:
+            return None
+        if zlib.crc32(payload) != crc:
+            raise CorruptedLogException('Bad checksum for the game at offset {}'.format(file.tell() - length - HEADER.size))
+        moves = []
+        offset = 0
+        for i in range(nbmoves):
+            move, offset = self.__codec.decode(payload, offset)
+            moves.append(move)
+        return GameRecord(moves, None if result == DRAW else result, bool(flags & ON_TIME))
+
+    def __open(self):
+        file = open(self.__path, 'rb', buffering=READ_BUFFER_SIZE)
+        if file.read(len(MAGIC)) != MAGIC:
+            file.close()
+            raise CorruptedLogException('{} is not a game log'.format(self.__path))
+        return file
+
+    def games(self, start=0, stop=None):
+        '''Generate the recorded games, from the 'start'-th until the 'stop'-th (excluded) or the end of the log.'''
+        with self.__open() as file:
+            if start > 0:
+                offset = self.offset(start)
+                if offset is None:
+                    return
+                file.seek(offset)
+            i = start
+            while stop is None or i < stop:
+                game = self.__read(file)
+                if game is None:
+                    return
+                yield game
+                i += 1
+
+    def __iter__(self):
+        return self.games()
+
+    def offset(self, i):
+        '''Return the offset of the 'i'-th game in the log, or None if there is no such game.'''
+        try:
+            with open(self.__path + '.idx', 'rb') as index:
+                index.seek(i * OFFSET.size)
+                data = index.read(OFFSET.size)
+        except OSError:
+            return None
+        return OFFSET.unpack(data)[0] if len(data) == OFFSET.size else None
+
+    def game(self, i):
+        '''Return the 'i'-th recorded game (found with the index).'''
+        offset = self.offset(i)
+        if offset is None:
+            raise IndexError('no game {} in {}'.format(i, self.__path))
+        with self.__open() as file:
+            file.seek(offset)
+            game = self.__read(file)
+        if game is None:
+            raise IndexError('no game {} in {}'.format(i, self.__path))
+        return game
+
+    def replay(self, game):
+        '''Generate the successive states of a recorded game, from the initial state to the final one.
+
+        Pre: 'game' is a GameRecord or the number of a game.
+        '''
+        if not isinstance(game, GameRecord):
+            game = self.game(game)
+        state = self.__codec.initialstate()
+        yield copy.deepcopy(state)
+        for move in game.moves:
+            self.__codec.apply(state, move)
+            yield copy.deepcopy(state)
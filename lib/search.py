@@ -0,0 +1,605 @@
+# search.py
+# Version: October 19, 2026
+
+from abc import *
+import copy
+import sys
+import threading
+import time
+
+WIN_SCORE = 1000000
+DEFAULT_TT_SIZE = 1 << 18
+# Default limits of the quiescence search: plies beyond the horizon, and nodes for each horizon node
+DEFAULT_QDEPTH = 4
+DEFAULT_QNODES = 64
+# Number of nodes between two checks of the deadline
+CHECK_INTERVAL = 16
+
+
+class SearchTimeout(Exception):
+    '''Exception raised internally to abort a search when its deadline is over.'''
+    pass
+
+
+class SearchStats:
+    '''Class collecting the statistics of the searches made by an engine.
+
+    The counters are reset before each move (see 'start') and the record
+    returned by 'end' is kept to build the summary of the game.
+    '''
+    def __init__(self):
+        self.__records = []
+        self.start()
+
+    def start(self):
+        '''Reset the counters for a new search.'''
+        self.nodes = 0
+        self.evaluations = 0
+        self.expanded = 0
+        self.children = 0
+        self.depth = 0
+        self.seldepth = 0
+        self.ttprobes = 0
+        self.tthits = 0
+        self.ttcollisions = 0
+        self.cutoffs = 0
+        self.firstcutoffs = 0
+        self.qnodes = 0
+        self.phases = {}
+        self.__start = time.perf_counter()
+        self.__elapsed = None
+
+    def node(self, ply):
+        self.nodes += 1
+        if ply > self.seldepth:
+            self.seldepth = ply
+
+    def expand(self, nbchildren):
+        self.expanded += 1
+        self.children += nbchildren
+
+    def probe(self, hit, collision=False):
+        self.ttprobes += 1
+        if hit:
+            self.tthits += 1
+        elif collision:
+            self.ttcollisions += 1
+
+    def cutoff(self, first):
+        self.cutoffs += 1
+        if first:
+            self.firstcutoffs += 1
+
+    def phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @property
+    def elapsed(self):
+        if self.__elapsed is not None:
+            return self.__elapsed
+        return time.perf_counter() - self.__start
+
+    @property
+    def nps(self):
+        elapsed = self.elapsed
+        return self.nodes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def branching(self):
+        '''Average number of children of the expanded nodes.'''
+        return self.children / self.expanded if self.expanded else 0.0
+
+    @property
+    def ttrate(self):
+        return self.tthits / self.ttprobes if self.ttprobes else 0.0
+
+    @property
+    def collisionrate(self):
+        return self.ttcollisions / self.ttprobes if self.ttprobes else 0.0
+
+    def end(self):
+        '''Stop the timer of the current search and return its record.'''
+        self.__elapsed = time.perf_counter() - self.__start
+        record = {
+            'nodes': self.nodes,
+            'time': self.__elapsed,
+            'nps': self.nps,
+            'depth': self.depth,
+            'seldepth': self.seldepth,
+            'branching': self.branching,
+            'evaluations': self.evaluations,
+            'ttprobes': self.ttprobes,
+            'tthits': self.tthits,
+            'ttcollisions': self.ttcollisions,
+            'cutoffs': self.cutoffs,
+            'firstcutoffs': self.firstcutoffs,
+            'qnodes': self.qnodes,
+            'phases': dict(self.phases)
+        }
+        self.__records.append(record)
+        return record
+
+    def add(self, record):
+        '''Keep the record of a search made elsewhere (by an engine service for instance).'''
+        self.__records.append(record)
+
+    @property
+    def records(self):
+        return list(self.__records)
+
+    def reset(self):
+        '''Forget the records of the previous searches (at the end of a game for instance).'''
+        self.__records = []
+
+    def summary(self):
+        '''Aggregate the records of all the searches since the creation of the stats or the last reset.'''
+        total = {'moves': len(self.__records), 'nodes': 0, 'time': 0.0, 'evaluations': 0,
+                 'ttprobes': 0, 'tthits': 0, 'ttcollisions': 0, 'cutoffs': 0, 'firstcutoffs': 0, 'qnodes': 0,
+                 'phases': {}}
+        depths = []
+        for record in self.__records:
+            for name in ('nodes', 'time', 'evaluations', 'ttprobes', 'tthits', 'ttcollisions', 'cutoffs', 'firstcutoffs',
+                         'qnodes'):
+                total[name] += record.get(name, 0)
+            for name, seconds in record['phases'].items():
+                total['phases'][name] = total['phases'].get(name, 0.0) + seconds
+            depths.append(record['depth'])
+        total['nps'] = total['nodes'] / total['time'] if total['time'] > 0 else 0.0
+        total['depth'] = sum(depths) / len(depths) if depths else 0.0
+        total['maxdepth'] = max(depths) if depths else 0
+        return total
+
+    @staticmethod
+    def format(record):
+        '''Return a one-line description of a record (or of a summary).'''
+        probes = record['ttprobes']
+        line = '{} nodes in {:.3f}s ({:.0f} nps), depth {}'.format(
+            record['nodes'], record['time'], record['nps'],
+            record['depth'] if isinstance(record['depth'], int) else '{:.1f}'.format(record['depth'])
+        )
+        if 'branching' in record:
+            line += ', branching {:.1f}'.format(record['branching'])
+        if record.get('qnodes') and record['nodes']:
+            line += ', quiescence {:.1%}'.format(record['qnodes'] / record['nodes'])
+        if record.get('cutoffs'):
+            line += ', first move cutoffs {:.1%}'.format(record['firstcutoffs'] / record['cutoffs'])
+        if probes:
+            line += ', tt hits {:.1%} collisions {:.1%}'.format(record['tthits'] / probes, record['ttcollisions'] / probes)
+        if record['time'] > 0 and record['phases']:
+            line += ', ' + ' '.join('{} {:.0%}'.format(name, seconds / record['time'])
+                                    for name, seconds in sorted(record['phases'].items()))
+        return line
+
+
+class SamplingProfiler:
+    '''Class representing a sampling profiler attributing the time of a thread
+    to the methods of some classes (the game state primitives for instance).
+
+    A background thread periodically looks at the stack of the profiled
+    thread and charges the sample to the innermost frame running one of
+    the watched methods, or to 'other' when there is none.
+    '''
+    def __init__(self, classes, interval=0.001):
+        self.__interval = interval
+        self.__codes = {}
+        for cls in classes:
+            for name, value in vars(cls).items():
+                code = getattr(value, '__code__', None)
+                if code is not None:
+                    self.__codes[code] = '{}.{}'.format(cls.__name__, name)
+        self.__samples = {}
+        self.__thread = None
+        self.__running = False
+
+    def start(self):
+        if self.__running:
+            return
+        self.__target = threading.get_ident()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def reset(self):
+        '''Forget the samples taken so far.'''
+        self.__samples = {}
+
+    def __sample(self):
+        while self.__running:
+            time.sleep(self.__interval)
+            frame = sys._current_frames().get(self.__target)
+            name = 'other'
+            while frame is not None:
+                if frame.f_code in self.__codes:
+                    name = self.__codes[frame.f_code]
+                    break
+                frame = frame.f_back
+            self.__samples[name] = self.__samples.get(name, 0) + 1
+
+    def report(self):
+        '''Return the list of (name, samples, fraction) sorted by decreasing number of samples.'''
+        total = sum(self.__samples.values())
+        return [(name, n, n / total) for name, n in sorted(self.__samples.items(), key=lambda item: -item[1])]
+
+    def prettyprint(self):
+        for name, n, fraction in self.report():
+            print('   {:>6.1%} {:>7} {}'.format(fraction, n, name))
+
+
+class TranspositionTable:
+    '''Class representing a fixed size transposition table.
+
+    Each slot holds one entry (key, depth, score, flag, move); a new entry
+    always replaces the previous content of its slot.
+    '''
+    EXACT, LOWER, UPPER = range(3)
+
+    def __init__(self, size=DEFAULT_TT_SIZE):
+        self.__size = size
+        self.__slots = [None] * size
+
+    def probe(self, key, stats=None):
+        entry = self.__slots[hash(key) % self.__size]
+        if entry is not None and entry[0] == key:
+            if stats is not None:
+                stats.probe(True)
+            return entry
+        if stats is not None:
+            stats.probe(False, entry is not None)
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        self.__slots[hash(key) % self.__size] = (key, depth, score, flag, move)
+
+    def clear(self):
+        self.__slots = [None] * self.__size
+
+
+class MoveOrdering:
+    '''Class representing the tables used to order the moves, kept from one search to the next.
+
+    The killers are the last quiet moves that caused a cutoff at each ply and
+    the history scores quiet moves by their dense id (see SearchEngine.moveid).
+    '''
+    NBKILLERS = 2
+
+    def __init__(self, nbmoveids):
+        self.killers = {}
+        self.history = [0] * nbmoveids
+
+    def addkiller(self, ply, move):
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.NBKILLERS:]
+
+    def reward(self, moveid, depth):
+        if moveid is not None:
+            self.history[moveid] += depth * depth
+
+    def age(self):
+        '''Forget the killers and halve the history, between two games.'''
+        self.killers.clear()
+        self.history = [score // 2 for score in self.history]
+
+
+class SearchEngine(metaclass=ABCMeta):
+    '''Abstract class representing an iterative deepening alpha-beta engine.
+
+    Subclasses describe the game with the 'moves', 'play', 'undo', 'evaluate',
+    'terminal' and 'key' primitives; the engine reports its work in 'stats'.
+    Several engines can share a transposition table ('tt') and replace
+    'evaluate' by another 'evaluator' (a batching one for instance).
+    With 'ordering', the moves are tried in this order: the move of the
+    transposition table, the tactical moves (see 'classify'), the killers
+    and the others by history; without, the transposition table move first
+    and the others in the order of 'moves'. With 'quiescence', the horizon
+    nodes are not evaluated before their noisy moves (see 'noisy') are
+    searched, for at most 'qdepth' plies and 'qnodes' nodes.
+    '''
+    # Number of dense move ids given by 'moveid'
+    nbmoveids = 0
+
+    def __init__(self, maxdepth=64, ttsize=DEFAULT_TT_SIZE, tt=None, evaluator=None, ordering=True,
+                 quiescence=True, qdepth=DEFAULT_QDEPTH, qnodes=DEFAULT_QNODES):
+        self.maxdepth = maxdepth
+        self.stats = SearchStats()
+        self.tt = tt if tt is not None else TranspositionTable(ttsize)
+        self.ordering = MoveOrdering(self.nbmoveids) if ordering else None
+        self.quiescence = quiescence
+        self.qdepth = qdepth
+        self.qnodes = qnodes
+        self.__qbudget = 0
+        self.__evaluator = evaluator if evaluator is not None else self.evaluate
+        self.__deadline = None
+
+    @abstractmethod
+    def moves(self, state):
+        '''Generate the moves.
+
+        Pre: -
+        Post: The returned value is the list of the valid moves for the player to play in 'state'.
+        '''
+        ...
+
+    @abstractmethod
+    def play(self, state, move):
+        '''Play a move.
+
+        Pre: 'move' is a valid move in 'state'.
+        Post: 'move' has been applied on 'state'; the returned value is what
+              'undo' needs to take it back.
+        '''
+        ...
+
+    @abstractmethod
+    def undo(self, state, move, info):
+        '''Take back a move.
+
+        Pre: 'move' is the last move played on 'state' and 'info' the value returned by 'play'.
+        Post: 'state' is back to what it was before 'move' was played.
+        '''
+        ...
+
+    @abstractmethod
+    def evaluate(self, state):
+        '''Evaluate a state.
+
+        Pre: The game is not finished in 'state'.
+        Post: The returned value is the score of 'state' for the player to play.
+        '''
+        ...
+
+    def evaluatebatch(self, states):
+        '''Evaluate several states at once.
+
+        Pre: The game is not finished in any of the 'states'.
+        Post: The returned value is the list of the scores of 'states' (see 'evaluate').
+        '''
+        return [self.evaluate(state) for state in states]
+
+    def classify(self, state, moves):
+        '''Classify moves for their ordering.
+
+        Pre: 'moves' are valid moves in 'state'.
+        Post: The returned value is the list of the priorities of 'moves': 0 for a
+              quiet move, more for the tactical ones (all 0 by default).
+        '''
+        return [0] * len(moves)
+
+    def noisy(self, state, moves):
+        '''Select the moves searched beyond the horizon.
+
+        Pre: 'moves' are the valid moves in 'state'.
+        Post: The returned value is the list of the moves of 'moves' that change
+              the evaluation sharply (the tactical ones by default, see 'classify').
+        '''
+        return [move for move, tactical in zip(moves, self.classify(state, moves)) if tactical]
+
+    def moveid(self, move):
+        '''Return the dense id of 'move' in [0, nbmoveids[, or None if it has none (the default).'''
+        return None
+
+    def newgame(self):
+        '''Age the move ordering tables before a new game.'''
+        if self.ordering is not None:
+            self.ordering.age()
+
+    @abstractmethod
+    def terminal(self, state):
+        '''Check whether the game is finished.
+
+        Pre: -
+        Post: The returned value is None if the game goes on, or else the score
+              of 'state' for the player to play (0 for a draw, +/- WIN_SCORE otherwise).
+        '''
+        ...
+
+    @abstractmethod
+    def key(self, state):
+        '''Return a hashable value identifying 'state' for the transposition table.'''
+        ...
+
+    def _generate(self, state):
+        start = time.perf_counter()
+        moves = self.moves(state)
+        self.stats.phase('movegen', time.perf_counter() - start)
+        return moves
+
+    def _evaluate(self, state):
+        start = time.perf_counter()
+        score = self.__evaluator(state)
+        self.stats.phase('evaluate', time.perf_counter() - start)
+        self.stats.evaluations += 1
+        return score
+
+    def _checktime(self):
+        if self.__deadline is not None and self.stats.nodes % CHECK_INTERVAL == 0:
+            if time.perf_counter() >= self.__deadline:
+                raise SearchTimeout()
+
+    def _negamax(self, state, depth, alpha, beta, ply):
+        stats = self.stats
+        stats.node(ply)
+        self._checktime()
+        score = self.terminal(state)
+        if score is not None:
+            # Prefer the quickest wins and the slowest losses
+            return score - ply if score > 0 else score + ply if score < 0 else 0
+        if depth <= 0:
+            if self.quiescence:
+                self.__qbudget = self.qnodes
+                return self._quiesce(state, alpha, beta, ply, self.qdepth)
+            return self._evaluate(state)
+        key = self.key(state)
+        entry = self.tt.probe(key, stats)
+        ttmove = None
+        if entry is not None:
+            ttmove = entry[4]
+            if entry[1] >= depth:
+                if entry[3] == TranspositionTable.EXACT:
+                    return entry[2]
+                if entry[3] == TranspositionTable.LOWER and entry[2] >= beta:
+                    return entry[2]
+                if entry[3] == TranspositionTable.UPPER and entry[2] <= alpha:
+                    return entry[2]
+        moves = self._generate(state)
+        if not moves:
+            return self._evaluate(state)
+        stats.expand(len(moves))
+        moves, tactical = self._order(state, moves, ttmove, ply)
+        origalpha = alpha
+        best, bestmove = -WIN_SCORE - 1, None
+        for i, move in enumerate(moves):
+            info = self.play(state, move)
+            score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            self.undo(state, move, info)
+            if score > best:
+                best, bestmove = score, move
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                stats.cutoff(i == 0)
+                if self.ordering is not None and not tactical[i]:
+                    self.ordering.addkiller(ply, move)
+                    self.ordering.reward(self.moveid(move), depth)
+                break
+        if best <= origalpha:
+            flag = TranspositionTable.UPPER
+        elif best >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(key, depth, best, flag, bestmove)
+        return best
+
+    def _quiesce(self, state, alpha, beta, ply, qdepth):
+        stats = self.stats
+        if qdepth < self.qdepth:
+            stats.node(ply)
+            stats.qnodes += 1
+            self._checktime()
+            score = self.terminal(state)
+            if score is not None:
+                return score - ply if score > 0 else score + ply if score < 0 else 0
+        self.__qbudget -= 1
+        standpat = self._evaluate(state)
+        if standpat >= beta or qdepth <= 0 or self.__qbudget <= 0:
+            return standpat
+        moves = self.noisy(state, self._generate(state))
+        if not moves:
+            return standpat
+        if standpat > alpha:
+            alpha = standpat
+        best = standpat
+        for move in self._order(state, moves, None, ply)[0]:
+            info = self.play(state, move)
+            score = -self._quiesce(state, -beta, -alpha, ply + 1, qdepth - 1)
+            self.undo(state, move, info)
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+        return best
+
+    def _order(self, state, moves, ttmove, ply):
+        '''Sort the moves and return them with their tactical priorities.'''
+        if self.ordering is None:
+            if ttmove is not None and ttmove in moves:
+                moves.remove(ttmove)
+                moves.insert(0, ttmove)
+            return moves, [0] * len(moves)
+        start = time.perf_counter()
+        classes = self.classify(state, moves)
+        killers = self.ordering.killers.get(ply, ())
+        history = self.ordering.history
+        keys = []
+        for move, tactical in zip(moves, classes):
+            if move == ttmove:
+                key = 1 << 40
+            elif tactical:
+                key = tactical << 32
+            elif move in killers:
+                key = (1 << 31) - killers.index(move)
+            else:
+                moveid = self.moveid(move)
+                key = history[moveid] if moveid is not None else 0
+            keys.append(key)
+        order = sorted(range(len(moves)), key=lambda i: -keys[i])
+        self.stats.phase('ordering', time.perf_counter() - start)
+        return [moves[i] for i in order], [classes[i] for i in order]
+
+    def _root(self, state, depth, best):
+        # the children are counted by _negamax
+        self.stats.node(0)
+        moves = self._generate(state)
+        self.stats.expand(len(moves))
+        moves = self._order(state, moves, best, 0)[0]
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        bestmove = None
+        for move in moves:
+            info = self.play(state, move)
+            score = -self._negamax(state, depth - 1, -beta, -alpha, 1)
+            self.undo(state, move, info)
+            if bestmove is None or score > alpha:
+                alpha, bestmove = score, move
+        return bestmove, alpha
+
+    def bestmove(self, state, timelimit=None, depth=None):
+        '''Search the best move.
+
+        Pre: The game is not finished in 'state'; 'timelimit' is in seconds.
+        Post: The returned value is the best move found by searching 'state'
+              up to 'depth' (or 'maxdepth') plies, stopping when 'timelimit'
+              is over; 'state' is left unchanged.
+        '''
+        self.stats.start()
+        self.__deadline = time.perf_counter() + timelimit if timelimit is not None else None
+        # An aborted search leaves its state in the middle of a line, hence the copy
+        original, state = state, copy.deepcopy(state)
+        best = None
+        try:
+            for d in range(1, (depth or self.maxdepth) + 1):
+                move, score = self._root(state, d, best)
+                if move is None:
+                    break
+                best = move
+                self.stats.depth = d
+                if abs(score) >= WIN_SCORE - self.maxdepth:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.__deadline = None
+        if best is None:
+            moves = self.moves(original)
+            best = moves[0] if moves else None
+        self.stats.end()
+        return best
+
+
+def benchmark(engines, states, depth):
+    '''Compare engines on the same positions.
+
+    Pre: 'engines' maps names to engines, 'states' are positions where the game goes on.
+    Post: The returned value maps the name of each engine to its total number of
+          nodes and time to search all the 'states' (in this order) up to 'depth'.
+    '''
+    results = {}
+    for name, engine in engines.items():
+        nodes = []
+        elapsed = 0.0
+        for state in states:
+            engine.bestmove(state, depth=depth)
+            record = engine.stats.records[-1]
+            nodes.append(record['nodes'])
+            elapsed += record['time']
+        results[name] = {'nodes': sum(nodes), 'time': elapsed, 'positions': nodes}
+    return results
@@ -0,0 +1,149 @@
+# selfplay.py
+# Version: October 19, 2026
+
+import copy
+import random
+import time
+
+from lib import search
+
+DEFAULT_NB_GAMES = 256
+
+
+class _Game:
+    '''A game being played by the driver: its state and its moves so far.'''
+    def __init__(self, state):
+        self.state = state
+        self.moves = []
+
+
+class LockstepSelfPlay:
+    '''Class representing a self-play driver advancing many games in lockstep.
+
+    At each step, the tree of every running game is expanded up to 'depth'
+    plies with the primitives of 'engine' (a SearchEngine), the leaves of all
+    the games are evaluated together with a single call to
+    'engine.evaluatebatch', and each game plays the move with the best
+    negamax score (a random move with probability 'exploration'). Finished
+    games are recorded in 'log' and replaced by new ones made by 'newstate',
+    so that the batch stays full. A game still going on after 'maxmoves'
+    moves is a draw.
+
+    The players are expected to alternate, the first move being played by
+    player 0, and a player without any valid move loses.
+    '''
+    def __init__(self, engine, newstate, maxmoves, nbgames=DEFAULT_NB_GAMES, depth=1, exploration=0.1, log=None,
+                 seed=None):
+        self.__engine = engine
+        self.__newstate = newstate
+        self.__nbgames = nbgames
+        # at least the moves of the games themselves
+        self.__depth = max(depth, 1)
+        self.__exploration = exploration
+        self.__log = log
+        self.__maxmoves = maxmoves
+        self.__random = random.Random(seed)
+        self.stats = {
+            'games': 0, 'results': {}, 'moves': 0, 'steps': 0, 'batches': 0,
+            'positions': 0, 'evaltime': 0.0, 'time': 0.0
+        }
+
+    def __expand(self, state, depth, leaves):
+        '''Return the tree of 'state' up to 'depth' plies, its leaves being added to 'leaves'.
+
+        A tree is ('score', value) for a finished game, ('leaf', index in 'leaves')
+        or ('node', [(move, subtree)...]).
+        '''
+        engine = self.__engine
+        score = engine.terminal(state)
+        if score is not None:
+            return ('score', score)
+        if depth <= 0:
+            leaves.append(copy.deepcopy(state))
+            return ('leaf', len(leaves) - 1)
+        moves = engine.moves(state)
+        if not moves:
+            return ('score', -search.WIN_SCORE)
+        children = []
+        for move in moves:
+            info = engine.play(state, move)
+            children.append((move, self.__expand(state, depth - 1, leaves)))
+            engine.undo(state, move, info)
+        return ('node', children)
+
+    def __backup(self, tree, scores):
+        kind, value = tree
+        if kind == 'score':
+            return value
+        if kind == 'leaf':
+            return scores[value]
+        return max(-self.__backup(child, scores) for move, child in value)
+
+    def __finish(self, game, winner):
+        if self.__log is not None:
+            self.__log.append(game.moves, winner)
+        result = 'draw' if winner is None else str(winner)
+        self.stats['results'][result] = self.stats['results'].get(result, 0) + 1
+        self.stats['games'] += 1
+
+    def run(self, nbgames=None, duration=None):
+        '''Play until 'nbgames' games are finished or 'duration' seconds are over, and return the stats.'''
+        engine = self.__engine
+        size = self.__nbgames if nbgames is None else min(self.__nbgames, nbgames)
+        games = [_Game(self.__newstate()) for i in range(size)]
+        started = size
+        start = time.perf_counter()
+        while games:
+            if duration is not None and time.perf_counter() - start >= duration:
+                break
+            # gather the leaves of all the games
+            leaves = []
+            trees = [self.__expand(game.state, self.__depth, leaves) for game in games]
+            # evaluate them at once
+            evalstart = time.perf_counter()
+            scores = engine.evaluatebatch(leaves) if leaves else []
+            self.stats['evaltime'] += time.perf_counter() - evalstart
+            self.stats['batches'] += 1
+            self.stats['positions'] += len(leaves)
+            # scatter the scores and play one move in each game
+            running = []
+            for game, tree in zip(games, trees):
+                if tree[0] == 'node':
+                    children = tree[1]
+                    if self.__random.random() < self.__exploration:
+                        move = self.__random.choice(children)[0]
+                    else:
+                        # ties are broken at random so that the games differ
+                        move = max(
+                            children, key=lambda child: (-self.__backup(child[1], scores), self.__random.random())
+                        )[0]
+                    engine.play(game.state, move)
+                    game.moves.append(move)
+                    self.stats['moves'] += 1
+                    winner = game.state.winner()
+                    if winner == -1 and len(game.moves) < self.__maxmoves:
+                        running.append(game)
+                        continue
+                    if winner == -1:
+                        winner = None
+                else:
+                    # no valid move left, the player to play loses
+                    winner = (len(game.moves) + 1) % 2
+                self.__finish(game, winner)
+                if nbgames is None or started < nbgames:
+                    running.append(_Game(self.__newstate()))
+                    started += 1
+            games = running
+            self.stats['steps'] += 1
+        self.stats['time'] = time.perf_counter() - start
+        return self.stats
+
+    @staticmethod
+    def format(stats):
+        return '{} games, {} moves, {} positions in {} batches ({:.0f} per batch), {:.0f} positions/s ' \
+               '({:.0f} positions/s in the evaluation)'.format(
+                   stats['games'], stats['moves'], stats['positions'], stats['batches'],
+                   stats['positions'] / stats['batches'] if stats['batches'] else 0,
+                   stats['positions'] / stats['time'] if stats['time'] else 0,
+                   stats['positions'] / stats['evaltime'] if stats['evaltime'] else 0
+               )
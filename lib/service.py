@@ -0,0 +1,292 @@
+# service.py
+# Version: October 19, 2026
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from lib import search
+
+# Milliseconds kept aside by the service for the parsing and the answer
+SERVICE_MARGIN = 20
+DEFAULT_MAX_BATCH = 256
+# Seconds a position waits for the other searches before being evaluated anyway
+DEFAULT_MAX_WAIT = 0.002
+DEFAULT_CACHE_SIZE = 1 << 18
+# Seconds a client waits for the answer of the service beyond the time given for the move
+ANSWER_MARGIN = 0.1
+
+
+class ServiceException(Exception):
+    '''Exception representing an error reported by an engine service.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def parseaddress(address):
+    '''Return the address of a service given as 'host:port' or as the path of a Unix socket.'''
+    if '/' in address:
+        return address
+    host, port = address.rsplit(':', 1)
+    return (host or '127.0.0.1', int(port))
+
+
+class BatchEvaluator:
+    '''Class gathering the evaluations of concurrent searches into batches.
+
+    A search calling 'evaluate' waits until every registered search waits
+    for an evaluation too (or 'maxbatch' positions are pending, or 'maxwait'
+    is over), then all the pending positions are evaluated with a single
+    call to 'evaluatebatch'. Scores are cached by the key of the positions.
+    '''
+    def __init__(self, evaluatebatch, key, maxbatch=DEFAULT_MAX_BATCH, maxwait=DEFAULT_MAX_WAIT,
+                 cachesize=DEFAULT_CACHE_SIZE):
+        self.__evaluatebatch = evaluatebatch
+        self.__key = key
+        self.__maxbatch = maxbatch
+        self.__maxwait = maxwait
+        self.__cachesize = cachesize
+        self.__cache = {}
+        self.__condition = threading.Condition()
+        self.__pending = []
+        self.__active = 0
+        self.batches = 0
+        self.evaluations = 0
+        self.cachehits = 0
+
+    def register(self):
+        with self.__condition:
+            self.__active += 1
+
+    def unregister(self):
+        with self.__condition:
+            self.__active -= 1
+            if self.__pending and len(self.__pending) >= self.__active:
+                self.__flush()
+
+    def __flush(self):
+        pending, self.__pending = self.__pending, []
+        if not pending:
+            return
+        try:
+            scores = self.__evaluatebatch([slot[0] for slot in pending])
+        except Exception as e:
+            # each search waiting for one of these positions raises the error
+            for slot in pending:
+                slot[3] = e
+            self.__condition.notify_all()
+            return
+        if len(self.__cache) + len(pending) > self.__cachesize:
+            self.__cache.clear()
+        for slot, score in zip(pending, scores):
+            slot[1] = score
+            self.__cache[slot[2]] = score
+        self.batches += 1
+        self.evaluations += len(pending)
+        self.__condition.notify_all()
+
+    def evaluate(self, state):
+        key = self.__key(state)
+        with self.__condition:
+            score = self.__cache.get(key)
+            if score is not None:
+                self.cachehits += 1
+                return score
+            # the state is not modified while its search waits, no need for a copy
+            slot = [state, None, key, None]
+            self.__pending.append(slot)
+            if len(self.__pending) >= min(self.__active, self.__maxbatch):
+                self.__flush()
+            deadline = time.perf_counter() + self.__maxwait
+            while slot[1] is None and slot[3] is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.__flush()
+                else:
+                    self.__condition.wait(remaining)
+            if slot[3] is not None:
+                raise slot[3]
+            return slot[1]
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    '''Threading TCP server that can listen again on the port of a service that just stopped.'''
+    allow_reuse_address = True
+
+
+class OpeningBook:
+    '''Class representing an opening book: the move to play in some states (given by their string).'''
+    def __init__(self, moves=None):
+        self.__moves = dict(moves or {})
+
+    def __len__(self):
+        return len(self.__moves)
+
+    def get(self, state):
+        return self.__moves.get(str(state))
+
+    def add(self, state, move):
+        self.__moves[str(state)] = move
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls(json.load(file))
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.__moves, file)
+
+    @classmethod
+    def fromlog(cls, reader, plies=6, minimum=5):
+        '''Build a book with the moves of the first 'plies' moves of the games of a log.
+
+        Pre: 'reader' is a GameLogReader of a two-player game whose players
+             alternate, the first move being played by player 0.
+        Post: The returned book holds, for each state reached at least 'minimum'
+              times, the move with the best score for the player who played it.
+        '''
+        codec = reader.codec
+        counts = {}
+        for game in reader.games():
+            state = codec.initialstate()
+            for ply, move in enumerate(game.moves[:plies]):
+                key = str(state)
+                movekey = json.dumps(move, sort_keys=True)
+                result = 0.5 if game.winner is None else 1.0 if game.winner == ply % 2 else 0.0
+                entry = counts.setdefault(key, {}).setdefault(movekey, [0, 0.0])
+                entry[0] += 1
+                entry[1] += result
+                codec.apply(state, move)
+        book = cls()
+        for key, moves in counts.items():
+            if sum(entry[0] for entry in moves.values()) >= minimum:
+                movekey = max(moves, key=lambda m: (moves[m][1] / moves[m][0], moves[m][0]))
+                book.__moves[key] = json.loads(movekey)
+        return book
+
+
+class EngineService:
+    '''Class representing a long-running engine answering the best move of states.
+
+    The clients send lines 'BESTMOVE <milliseconds> <state>' and receive a JSON
+    line {"move": ..., "stats": ..., "book": ...} or 'ERROR <message>'. Every
+    request is searched in its own thread by a new engine made by
+    'enginefactory', all of them sharing one transposition table, one
+    batching evaluator with its cache, and the opening book.
+    '''
+    def __init__(self, address, stateclass, enginefactory, book=None, ttsize=search.DEFAULT_TT_SIZE,
+                 maxbatch=DEFAULT_MAX_BATCH, maxwait=DEFAULT_MAX_WAIT):
+        self.__address = address
+        self.__stateclass = stateclass
+        self.__enginefactory = enginefactory
+        self.__book = book if book is not None else OpeningBook()
+        self.__tt = search.TranspositionTable(ttsize)
+        reference = enginefactory(tt=self.__tt)
+        self.evaluator = BatchEvaluator(reference.evaluatebatch, reference.key, maxbatch, maxwait)
+        self.__server = None
+
+    def bestmove(self, state, milliseconds):
+        '''Search the best move of 'state' within 'milliseconds' and return the answer sent to the client.'''
+        move = self.__book.get(state)
+        if move is not None:
+            return {'move': move, 'stats': None, 'book': True}
+        engine = self.__enginefactory(tt=self.__tt, evaluator=self.evaluator.evaluate)
+        self.evaluator.register()
+        try:
+            move = engine.bestmove(state, max(milliseconds - SERVICE_MARGIN, 1) / 1000)
+        finally:
+            self.evaluator.unregister()
+        return {'move': move, 'stats': engine.stats.records[-1], 'book': False}
+
+    def serve(self):
+        service = self
+        stateclass = self.__stateclass
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode().strip()
+                    try:
+                        command, milliseconds, state = line.split(' ', 2)
+                        if command != 'BESTMOVE':
+                            raise ValueError('unknown command {}'.format(command))
+                        answer = json.dumps(service.bestmove(stateclass.parse(state), int(milliseconds)))
+                    except Exception as e:
+                        answer = 'ERROR {}'.format(e).replace('\n', ' ')
+                    self.wfile.write((answer + '\n').encode())
+                    self.wfile.flush()
+
+        if isinstance(self.__address, str):
+            if os.path.exists(self.__address):
+                os.remove(self.__address)
+            self.__server = socketserver.ThreadingUnixStreamServer(self.__address, Handler)
+        else:
+            self.__server = _TCPServer(self.__address, Handler)
+        self.__server.daemon_threads = True
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__server.server_close()
+
+    def shutdown(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+
+
+class ServiceEngine:
+    '''Class representing an engine whose moves are searched by an EngineService.
+
+    It has the same 'bestmove' and 'stats' as a SearchEngine, so that it can
+    replace one in a client.
+    '''
+    def __init__(self, address):
+        self.__address = address
+        self.__connexion = None
+        self.stats = search.SearchStats()
+
+    def __connect(self):
+        if isinstance(self.__address, str):
+            connexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connexion.connect(self.__address)
+        else:
+            connexion = socket.create_connection(self.__address)
+        self.__connexion = connexion
+        self.__file = connexion.makefile('rwb')
+
+    def bestmove(self, state, timelimit=None, depth=None):
+        if self.__connexion is None:
+            self.__connect()
+        milliseconds = int((timelimit if timelimit is not None else 1.0) * 1000)
+        # a stalled service must not make the client lose on time
+        self.__connexion.settimeout(milliseconds / 1000 + ANSWER_MARGIN)
+        try:
+            self.__file.write('BESTMOVE {} {}\n'.format(milliseconds, state).encode())
+            self.__file.flush()
+            answer = self.__file.readline().decode()
+        except socket.timeout:
+            # the answer may still come, the connexion can not be used anymore
+            self.close()
+            raise ServiceException('The engine service did not answer within {} ms'.format(milliseconds))
+        if answer == '':
+            self.close()
+            raise ServiceException('The engine service closed the connexion')
+        if answer.startswith('ERROR'):
+            raise ServiceException(answer[len('ERROR '):].strip())
+        answer = json.loads(answer)
+        if answer['stats'] is not None:
+            self.stats.add(answer['stats'])
+        else:
+            # a move of the book costs no search
+            self.stats.start()
+            self.stats.end()
+        return answer['move']
+
+    def close(self):
+        if self.__connexion is not None:
+            self.__file.close()
+            self.__connexion.close()
+            self.__connexion = None
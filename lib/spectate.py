@@ -0,0 +1,190 @@
+# spectate.py
+# Version: October 19, 2026
+
+import collections
+import json
+import queue
+import selectors
+import socket
+import threading
+
+DEFAULT_SPECTATOR_PORT = 5001
+# Number of lines a spectator may lag behind before being resynchronised
+DEFAULT_QUEUE_SIZE = 64
+RECEIVE_SIZE = 4096
+
+
+class _Spectator:
+    '''Connexion of a spectator with its bounded queue of lines to send.'''
+    def __init__(self, connexion):
+        self.connexion = connexion
+        self.lines = collections.deque()
+        self.pending = b''
+        self.dropped = 0
+
+
+class SpectatorHub:
+    '''Class representing the endpoint where spectators follow the games of a server.
+
+    The game loop only hands its events to 'publish', which queues them and
+    returns; a background thread encodes them as JSON lines and sends them
+    on non-blocking sockets. A spectator lagging more than 'queuesize' lines
+    behind has its lines dropped and gets a 'sync' line with the last state
+    instead, so that slow spectators never slow down the game.
+    '''
+    def __init__(self, port=DEFAULT_SPECTATOR_PORT, queuesize=DEFAULT_QUEUE_SIZE):
+        self.__port = port
+        self.__queuesize = queuesize
+        self.__events = queue.SimpleQueue()
+        self.__spectators = {}
+        self.__latest = None
+        # Lines of the events published after the last state (an invalid move, the end of the game)
+        self.__since = collections.deque(maxlen=queuesize)
+        self.__thread = None
+        self.__running = False
+
+    @property
+    def port(self):
+        return self.__port
+
+    @property
+    def nbspectators(self):
+        return len(self.__spectators)
+
+    def start(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('0.0.0.0', self.__port))
+        listener.listen()
+        listener.setblocking(False)
+        self.__listener = listener
+        self.__wakeup, self.__waker = socket.socketpair()
+        self.__wakeup.setblocking(False)
+        self.__waker.setblocking(False)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def publish(self, event, **fields):
+        '''Publish an event to the spectators.
+
+        Pre: The values of 'fields' can be encoded in JSON, 'state' being the string of a GameState.
+        Post: The event has been queued for the spectators (without waiting for them).
+        '''
+        if not self.__running:
+            return
+        self.__events.put((event, fields))
+        try:
+            self.__waker.send(b'\0')
+        except (BlockingIOError, OSError):
+            # the thread already has a wake up waiting
+            pass
+
+    def close(self):
+        if not self.__running:
+            return
+        self.__running = False
+        self.__waker.send(b'\0')
+        self.__thread.join()
+
+    def __encode(self, event, fields):
+        fields = dict(fields, event=event)
+        if 'state' in fields:
+            fields['state'] = json.loads(fields['state'])
+            self.__latest = fields
+            self.__since.clear()
+        line = (json.dumps(fields, separators=(',', ':')) + '\n').encode()
+        if 'state' not in fields:
+            self.__since.append(line)
+        return line
+
+    def __sync(self, spectator):
+        # the line being sent is kept, the stream must stay made of whole lines
+        spectator.lines.clear()
+        if self.__latest is not None:
+            fields = dict(self.__latest, event='sync')
+            spectator.lines.append((json.dumps(fields, separators=(',', ':')) + '\n').encode())
+        # what happened since the last state, the result of the game in particular
+        spectator.lines.extend(self.__since)
+
+    def __flush(self, selector, spectator):
+        try:
+            while spectator.pending or spectator.lines:
+                if not spectator.pending:
+                    spectator.pending = spectator.lines.popleft()
+                sent = spectator.connexion.send(spectator.pending)
+                spectator.pending = spectator.pending[sent:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.__drop(selector, spectator)
+            return
+        events = selectors.EVENT_READ
+        if spectator.pending or spectator.lines:
+            events |= selectors.EVENT_WRITE
+        selector.modify(spectator.connexion, events, spectator)
+
+    def __drop(self, selector, spectator):
+        selector.unregister(spectator.connexion)
+        spectator.connexion.close()
+        del self.__spectators[spectator.connexion]
+
+    def __run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.__listener, selectors.EVENT_READ, 'accept')
+        selector.register(self.__wakeup, selectors.EVENT_READ, 'wakeup')
+        while self.__running:
+            for key, mask in selector.select():
+                if key.data == 'accept':
+                    try:
+                        connexion = self.__listener.accept()[0]
+                    except BlockingIOError:
+                        continue
+                    connexion.setblocking(False)
+                    spectator = self.__spectators[connexion] = _Spectator(connexion)
+                    selector.register(connexion, selectors.EVENT_READ, spectator)
+                    self.__sync(spectator)
+                    self.__flush(selector, spectator)
+                elif key.data == 'wakeup':
+                    try:
+                        while self.__wakeup.recv(RECEIVE_SIZE):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    lines = []
+                    while True:
+                        try:
+                            lines.append(self.__encode(*self.__events.get_nowait()))
+                        except queue.Empty:
+                            break
+                    for spectator in list(self.__spectators.values()):
+                        if len(spectator.lines) + len(lines) > self.__queuesize:
+                            # too slow, skip to the last state
+                            spectator.dropped += 1
+                            self.__sync(spectator)
+                        else:
+                            spectator.lines.extend(lines)
+                        self.__flush(selector, spectator)
+                else:
+                    spectator = key.data
+                    if spectator.connexion not in self.__spectators:
+                        # dropped earlier in this round
+                        continue
+                    if mask & selectors.EVENT_READ:
+                        try:
+                            data = spectator.connexion.recv(RECEIVE_SIZE)
+                        except BlockingIOError:
+                            data = None
+                        except OSError:
+                            data = b''
+                        if data == b'':
+                            self.__drop(selector, spectator)
+                            continue
+                    if mask & selectors.EVENT_WRITE:
+                        self.__flush(selector, spectator)
+        for spectator in list(self.__spectators.values()):
+            self.__drop(selector, spectator)
+        selector.close()
+        self.__listener.close()
+        self.__wakeup.close()
+        self.__waker.close()
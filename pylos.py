@@ -6,8 +6,35 @@
 
 import argparse
 import json
+import random
+import socket
 
 from lib import game
+from lib import metrics
+from lib import record
+from lib import search
+from lib import selfplay
+from lib import service
+from lib import spectate
+
+# Index of the first position of each layer when the board is flattened
+LAYER_OFFSETS = (0, 16, 25, 29)
+POSITIONS = [[layer, row, column] for layer in range(4) for row in range(4 - layer) for column in range(4 - layer)]
+
+
+def flatindex(coord):
+    layer, row, column = coord
+    return LAYER_OFFSETS[layer] + row * (4 - layer) + column
+
+# Indexes in the flattened board of the four positions of each square that supports a sphere
+SQUARES = [
+    tuple(LAYER_OFFSETS[layer] + (row + r) * (4 - layer) + column + c for r, c in ((0, 0), (1, 0), (0, 1), (1, 1)))
+    for layer in range(3) for row in range(3 - layer) for column in range(3 - layer)
+]
+# The squares each position is part of
+SQUARES_OF = [[square for square in SQUARES if i in square] for i in range(len(POSITIONS))]
+# Number of moves after which an in-process game is declared a draw
+MAX_MOVES = 200
 
 
 class PylosState(game.GameState):
@@ -142,6 +169,81 @@ class PylosState(game.GameState):
 
         state['turn'] = (state['turn'] + 1) % 2
 
+    # take back a move applied with update (the move is not checked)
+    def undo(self, move, player):
+        state = self._state['visible']
+        board = state['board']
+        for layer, row, column in reversed(move.get('remove', [])):
+            board[layer][row][column] = player
+            state['reserve'][player] -= 1
+        layer, row, column = move['to']
+        board[layer][row][column] = None
+        if move['move'] == 'place':
+            state['reserve'][player] += 1
+        else:
+            layer, row, column = move['from']
+            board[layer][row][column] = player
+        state['turn'] = (state['turn'] + 1) % 2
+
+    # return the list of the positions of the spheres of player that can be removed
+    def removable(self, player):
+        board = self._state['visible']['board']
+        positions = []
+        for layer in range(4):
+            for row in range(4 - layer):
+                for column in range(4 - layer):
+                    if board[layer][row][column] == player:
+                        try:
+                            self.canMove(layer, row, column)
+                            positions.append([layer, row, column])
+                        except game.InvalidMoveException:
+                            pass
+        return positions
+
+    # return the list of the valid moves for the player to play
+    def moves(self):
+        state = self._state['visible']
+        board = state['board']
+        player = state['turn']
+        free = []
+        for layer in range(4):
+            for row in range(4 - layer):
+                for column in range(4 - layer):
+                    try:
+                        self.validPosition(layer, row, column)
+                        free.append([layer, row, column])
+                    except game.InvalidMoveException:
+                        pass
+        movable = self.removable(player)
+        moves = []
+        for to in free:
+            if state['reserve'][player] > 0:
+                moves.append({'move': 'place', 'to': to})
+            for source in movable:
+                # a sphere can not move up onto the square it is part of
+                if source[0] < to[0] and not (
+                    source[0] == to[0] - 1 and 0 <= source[1] - to[1] <= 1 and 0 <= source[2] - to[2] <= 1
+                ):
+                    moves.append({'move': 'move', 'from': source, 'to': to})
+        result = []
+        for move in moves:
+            result.append(move)
+            self.update(move, player)
+            if self.createSquare(move['to']):
+                seen = set()
+                for first in self.removable(player):
+                    result.append(dict(move, remove=[first]))
+                    layer, row, column = first
+                    board[layer][row][column] = None
+                    for second in self.removable(player):
+                        pair = frozenset((tuple(first), tuple(second)))
+                        if pair not in seen:
+                            seen.add(pair)
+                            result.append(dict(move, remove=[first, second]))
+                    board[layer][row][column] = player
+            self.undo(move, player)
+        return result
+
     # return 0 or 1 if a winner, return None if draw, return -1 if game continue
     def winner(self):
         state = self._state['visible']
@@ -177,11 +279,55 @@ class PylosState(game.GameState):
         # print(json.dumps(self._state['visible'], indent=4))
 
 
+class PylosCodec(record.RecordCodec):
+    """Class representing the binary encoding of the Pylos moves in game logs.
+
+    A move is one byte for its kind (bit 0 set for 'move') and its number of
+    removed spheres (bits 1-2), followed by the index of 'to', of 'from'
+    for a 'move' and of the removed spheres.
+    """
+
+    def position(self, coord):
+        return flatindex(coord)
+
+    def encode(self, move):
+        if isinstance(move, str):
+            move = json.loads(move)
+        remove = move.get('remove', [])
+        data = [(1 if move['move'] == 'move' else 0) | len(remove) << 1, self.position(move['to'])]
+        if move['move'] == 'move':
+            data.append(self.position(move['from']))
+        data.extend(self.position(coord) for coord in remove)
+        return bytes(data)
+
+    def decode(self, data, offset):
+        kind = data[offset]
+        move = {'move': 'move' if kind & 1 else 'place', 'to': list(POSITIONS[data[offset + 1]])}
+        offset += 2
+        if kind & 1:
+            move['from'] = list(POSITIONS[data[offset]])
+            offset += 1
+        nbremove = kind >> 1
+        if nbremove:
+            move['remove'] = [list(POSITIONS[i]) for i in data[offset:offset + nbremove]]
+            offset += nbremove
+        return move, offset
+
+    def initialstate(self):
+        return PylosState()
+
+    def apply(self, state, move):
+        state.update(move, state._state['visible']['turn'])
+
+
 class PylosServer(game.GameServer):
     """Class representing a server for the Pylos game."""
 
-    def __init__(self, verbose=False):
-        super().__init__('Pylos', 2, PylosState(), verbose=verbose)
+    def __init__(self, verbose=False, metrics=None, timecontrol=None, record=None, nbgames=1, spectators=None):
+        super().__init__(
+            'Pylos', 2, PylosState(), verbose=verbose, metrics=metrics, timecontrol=timecontrol, record=record,
+            nbgames=nbgames, spectators=spectators
+        )
 
     def applymove(self, move):
         try:
@@ -190,12 +336,118 @@ class PylosServer(game.GameServer):
             raise game.InvalidMoveException('move must be valid JSON string: {}'.format(move))
 
 
+class PylosEngine(search.SearchEngine):
+    """Class representing an alpha-beta search engine for the Pylos game."""
+
+    # a place is identified by its position, a move by its two positions
+    nbmoveids = len(POSITIONS) + len(POSITIONS) ** 2
+
+    def moves(self, state):
+        return state.moves()
+
+    def play(self, state, move):
+        state.update(move, state._state['visible']['turn'])
+
+    def undo(self, state, move, info):
+        state.undo(move, (state._state['visible']['turn'] + 1) % 2)
+
+    def terminal(self, state):
+        winner = state.winner()
+        if winner == -1:
+            return None
+        return search.WIN_SCORE if winner == state._state['visible']['turn'] else -search.WIN_SCORE
+
+    def moveid(self, move):
+        if move['move'] == 'place':
+            return flatindex(move['to'])
+        return len(POSITIONS) * (1 + flatindex(move['from'])) + flatindex(move['to'])
+
+    # completing a square first (the more spheres removed the better), then blocking one
+    def classify(self, state, moves):
+        cells = self.key(state)
+        player = cells[-1]
+        other = 1 - player
+        classes = []
+        for move in moves:
+            if 'remove' in move:
+                classes.append(2 + len(move['remove']))
+                continue
+            i = flatindex(move['to'])
+            tactical = 0
+            for square in SQUARES_OF[i]:
+                others = [cells[j] for j in square if j != i]
+                if others.count(player) == 3:
+                    tactical = 2
+                    break
+                if others.count(other) == 3:
+                    tactical = 1
+            classes.append(tactical)
+        return classes
+
+    # moving a sphere up saves one from the reserve, like a capture
+    def noisy(self, state, moves):
+        return [
+            move for move, tactical in zip(moves, self.classify(state, moves)) if tactical or move['move'] == 'move'
+        ]
+
+    def key(self, state):
+        st = state._state['visible']
+        # the reserves are given by the board since each player owns 15 spheres
+        return tuple(cell for layer in st['board'] for row in layer for cell in row) + (st['turn'],)
+
+    # spheres in reserve are the material, plus the squares that wait for a last sphere
+    def evaluate(self, state):
+        st = state._state['visible']
+        board = st['board']
+        player = st['turn']
+        other = (player + 1) % 2
+        score = (st['reserve'][player] - st['reserve'][other]) * 100
+        for layer in range(3):
+            for row in range(3 - layer):
+                for column in range(3 - layer):
+                    cells = (
+                        board[layer][row][column], board[layer][row + 1][column],
+                        board[layer][row][column + 1], board[layer][row + 1][column + 1]
+                    )
+                    if cells.count(None) == 1:
+                        if cells.count(player) == 3:
+                            score += 30
+                        elif cells.count(other) == 3:
+                            score -= 30
+        return score
+
+    # the same evaluation made square by square over the whole batch on the flattened boards
+    def evaluatebatch(self, states):
+        keys = [self.key(state) for state in states]
+        boards = [key[:-1] for key in keys]
+        players = [key[-1] for key in keys]
+        # each player owns 15 spheres, the difference of reserves is the opposite of the one on the board
+        scores = [
+            (board.count(1 - player) - board.count(player)) * 100 for board, player in zip(boards, players)
+        ]
+        for square in SQUARES:
+            for n, board in enumerate(boards):
+                cells = [board[i] for i in square]
+                if cells.count(None) == 1:
+                    if cells.count(players[n]) == 3:
+                        scores[n] += 30
+                    elif cells.count(1 - players[n]) == 3:
+                        scores[n] -= 30
+        return scores
+
+
 class PylosClient(game.GameClient):
     """Class representing a client for the Pylos game."""
 
-    def __init__(self, name, server, verbose=False):
-        super().__init__(server, PylosState, verbose=verbose)
+    def __init__(self, name, server, verbose=False, engine=None, timelimit=1.0, stats=False, profile=False):
         self.__name = name
+        # the game is played by the constructor of GameClient, hence the settings first
+        self.__engine = engine
+        self.__timelimit = timelimit
+        self.__stats = stats
+        # only the searches of an engine are profiled
+        self.__profiler = search.SamplingProfiler([PylosState, PylosEngine]) if profile and engine is not None else None
+        super().__init__(server, PylosState, verbose=verbose)
 
     # Cancel a move
     def cancelupdate(self, state, move, player):
@@ -232,8 +484,41 @@ class PylosClient(game.GameClient):
     def _handle(self, message):
         pass
 
+    def _gameended(self, result):
+        if isinstance(self.__engine, search.SearchEngine):
+            self.__engine.newgame()
+        if self.__engine is not None and self.__stats:
+            print(' Search summary:', search.SearchStats.format(self.__engine.stats.summary()))
+        if self.__profiler is not None:
+            print(' Profile:')
+            self.__profiler.prettyprint()
+            self.__profiler.reset()
+        # the summary and the profile are those of each game of a match
+        if self.__engine is not None:
+            self.__engine.stats.reset()
+
+    # return the move of the engine as string
+    def _searchmove(self, state):
+        timelimit = self.__timelimit
+        if self._timemanager is not None:
+            # each sphere left in reserve is at most one more move to play
+            st = state._state['visible']
+            timelimit = self._timemanager.budget(st['reserve'][st['turn']], timelimit * 1000) / 1000
+        if self.__profiler is not None:
+            self.__profiler.start()
+        try:
+            move = self.__engine.bestmove(state, timelimit)
+        finally:
+            if self.__profiler is not None:
+                self.__profiler.stop()
+        if self.__stats:
+            print(' Search:', search.SearchStats.format(self.__engine.stats.records[-1]))
+        return json.dumps(move)
+
     # return move as string
     def _nextmove(self, state):
+        if self.__engine is not None:
+            return self._searchmove(state)
         check = 0
         player = state._state['visible']['turn']
         noplayer = (player + 1) % 2
@@ -383,24 +668,197 @@ class PylosClient(game.GameClient):
                 check += 1
 
 
+# play a game between engines in this process, return its winner (None for a draw) and its moves
+def playgame(engines, timelimit=1.0, log=None, maxmoves=MAX_MOVES):
+    state = PylosState()
+    moves = []
+    winner = -1
+    while winner == -1:
+        player = state._state['visible']['turn']
+        if len(moves) >= maxmoves:
+            winner = None
+            break
+        move = engines[player].bestmove(state, timelimit)
+        if move is None:
+            # no valid move left, the player loses
+            winner = (player + 1) % 2
+            break
+        state.update(move, player)
+        moves.append(move)
+        winner = state.winner()
+    if log is not None:
+        log.append(moves, winner)
+    for engine in engines:
+        engine.newgame()
+    return winner, moves
+
+
+# return positions reached by random games, for benchmarks
+def randompositions(count, seed=0, minply=4, maxply=24):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = PylosState()
+        for ply in range(rng.randint(minply, maxply)):
+            moves = state.moves()
+            if not moves:
+                break
+            state.update(rng.choice(moves), state._state['visible']['turn'])
+            if state.winner() != -1:
+                break
+        if state.winner() == -1:
+            positions.append(state)
+    return positions
+
+
+# follow the games of a server as a spectator
+def watch(server):
+    with socket.create_connection(server) as s:
+        for line in s.makefile('r', encoding='utf-8'):
+            event = json.loads(line)
+            if event['event'] == 'turn':
+                print('\n=> Turn #{} (player {}): {}'.format(event['turn'], event['player'], event['move']))
+            elif event['event'] in ('start', 'sync'):
+                print('\n=> {}'.format('Game {} started'.format(event['game']) if event['event'] == 'start' else 'Resynchronised'))
+            elif event['event'] == 'invalid':
+                print('\n=> Invalid move of player {}: {}'.format(event['player'], event['error']))
+            elif event['event'] == 'end':
+                print('\n=> Game finished, winner: {}'.format(event['winner']))
+            if 'state' in event:
+                PylosState(event['state']).prettyprint()
+
+
+# argparse type of the durations that must be positive
+def positive(value):
+    seconds = float(value)
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError('{} is not a positive duration'.format(value))
+    return seconds
+
+
 if __name__ == '__main__':
     # Create the top-level parser
     parser = argparse.ArgumentParser(description='Pylos game')
-    subparsers = parser.add_subparsers(description='server client', help='Pylos game components', dest='component')
+    subparsers = parser.add_subparsers(description='server client watch service bench selfplay', help='Pylos game components', dest='component')
     # Create the parser for the 'server' subcommand
     server_parser = subparsers.add_parser('server', help='launch a server')
     server_parser.add_argument('--host', help='hostname (default: localhost)', default='localhost')
     server_parser.add_argument('--port', help='port to listen on (default: 5000)', default=5000)
     server_parser.add_argument('--verbose', action='store_true')
+    server_parser.add_argument('--metrics', help='file where to write the per-turn metrics as JSON')
+    server_parser.add_argument('--movetime', help='seconds allowed for each move (default: unlimited)', type=positive)
+    server_parser.add_argument('--clock', help='seconds on the clock of each player (default: unlimited)', type=positive)
+    server_parser.add_argument('--increment', help='seconds added to the clock after each move (default: 0)', type=float, default=0)
+    server_parser.add_argument('--record', help='game log where to append the played games')
+    server_parser.add_argument('--spectators', help='port where spectators can follow the games', type=int)
+    server_parser.add_argument('--games', help='number of games of the match, the players alternate who starts (default: 1)',
+                               type=int, default=1)
     # Create the parser for the 'client' subcommand
     client_parser = subparsers.add_parser('client', help='launch a client')
     client_parser.add_argument('name', help='name of the player')
     client_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
     client_parser.add_argument('--port', help='port of the server (default: 5000)', default=5000)
     client_parser.add_argument('--verbose', action='store_true')
+    client_parser.add_argument('--engine', help='play with the alpha-beta search engine', action='store_true')
+    client_parser.add_argument('--service', help='play with the engine service at host:port or at a Unix socket path')
+    client_parser.add_argument('--time', help='seconds of search per move without time control (default: 1)', type=float, default=1.0)
+    client_parser.add_argument('--stats', help='log the search statistics of each move', action='store_true')
+    client_parser.add_argument('--profile', help='profile the time spent in the state primitives', action='store_true')
+    # Create the parser for the 'watch' subcommand
+    watch_parser = subparsers.add_parser('watch', help='follow the games of a server')
+    watch_parser.add_argument('--host', help='hostname of the server (default: localhost)', default='127.0.0.1')
+    watch_parser.add_argument('--port', help='spectator port of the server (default: {})'.format(spectate.DEFAULT_SPECTATOR_PORT),
+                              type=int, default=spectate.DEFAULT_SPECTATOR_PORT)
+    # Create the parser for the 'service' subcommand
+    service_parser = subparsers.add_parser('service', help='launch an engine service')
+    service_parser.add_argument('address', help='host:port or path of a Unix socket to listen on')
+    service_parser.add_argument('--book', help='opening book (JSON) or game log to build it from')
+    service_parser.add_argument('--batch', help='maximum number of positions evaluated together (default: {})'
+                                .format(service.DEFAULT_MAX_BATCH), type=int, default=service.DEFAULT_MAX_BATCH)
+    # Create the parser for the 'bench' subcommand
+    bench_parser = subparsers.add_parser('bench', help='measure the nodes saved by the move ordering')
+    bench_parser.add_argument('--depth', help='depth of the searches (default: 3)', type=int, default=3)
+    bench_parser.add_argument('--positions', help='number of positions (default: 20)', type=int, default=20)
+    bench_parser.add_argument('--seed', help='seed of the positions (default: 0)', type=int, default=0)
+    # Create the parser for the 'selfplay' subcommand
+    selfplay_parser = subparsers.add_parser('selfplay', help='play games between two engines in this process')
+    selfplay_parser.add_argument('--games', help='number of games (default: 1, or the number of lockstep games)', type=int)
+    selfplay_parser.add_argument('--time', help='seconds of search per move (default: 1)', type=float, default=1.0)
+    selfplay_parser.add_argument('--record', help='game log where to append the played games')
+    selfplay_parser.add_argument('--verbose', action='store_true')
+    selfplay_parser.add_argument('--lockstep', help='play this many games at once, evaluating their positions in batches',
+                                 type=int)
+    selfplay_parser.add_argument('--depth', help='plies searched by the lockstep games (default: 1)', type=int, default=1)
+    selfplay_parser.add_argument('--seed', help='seed of the lockstep games', type=int)
     # Parse the arguments of sys.args
     args = parser.parse_args()
     if args.component == 'server':
-        PylosServer(verbose=args.verbose).run()
+        timecontrol = None
+        if args.movetime is not None or args.clock is not None:
+            try:
+                timecontrol = game.TimeControl(args.movetime, args.clock, args.increment)
+            except ValueError as e:
+                parser.error(str(e))
+        log = record.GameLog(args.record, PylosCodec()) if args.record else None
+        spectators = spectate.SpectatorHub(args.spectators) if args.spectators else None
+        if spectators is not None:
+            spectators.start()
+        server = PylosServer(
+            verbose=args.verbose, metrics=metrics.GameMetrics() if args.metrics else None,
+            timecontrol=timecontrol, record=log, nbgames=args.games, spectators=spectators
+        )
+        server.run()
+        if spectators is not None:
+            spectators.close()
+        if args.metrics:
+            server.metrics.dump(args.metrics)
+        if log is not None:
+            log.close()
+    elif args.component == 'service':
+        book = None
+        if args.book:
+            with open(args.book, 'rb') as file:
+                islog = file.read(len(record.MAGIC)) == record.MAGIC
+            if islog:
+                book = service.OpeningBook.fromlog(record.GameLogReader(args.book, PylosCodec()))
+            else:
+                book = service.OpeningBook.load(args.book)
+        service.EngineService(service.parseaddress(args.address), PylosState, PylosEngine, book, maxbatch=args.batch).serve()
+    elif args.component == 'watch':
+        watch((args.host, args.port))
+    elif args.component == 'bench':
+        results = search.benchmark(
+            {'plain': PylosEngine(ordering=False), 'ordered': PylosEngine(ordering=True)},
+            randompositions(args.positions, args.seed), args.depth
+        )
+        for name, result in results.items():
+            print('{:>8}: {} nodes in {:.2f}s'.format(name, result['nodes'], result['time']))
+        print('Node reduction: {:.1%}'.format(1 - results['ordered']['nodes'] / results['plain']['nodes']))
+    elif args.component == 'selfplay':
+        log = record.GameLog(args.record, PylosCodec()) if args.record else None
+        if args.lockstep:
+            driver = selfplay.LockstepSelfPlay(
+                PylosEngine(), PylosState, MAX_MOVES, args.lockstep, args.depth, log=log, seed=args.seed
+            )
+            # without a number of games, each lockstep game is played once
+            stats = driver.run(args.games if args.games is not None else args.lockstep)
+            print(selfplay.LockstepSelfPlay.format(stats))
+            if args.verbose:
+                print('Results: {}'.format(stats['results']))
+        else:
+            engines = [PylosEngine(), PylosEngine()]
+            for i in range(args.games if args.games is not None else 1):
+                winner, moves = playgame(engines, args.time, log)
+                if args.verbose:
+                    print('Game {}: {} moves, winner {}'.format(i, len(moves), winner))
+        if log is not None:
+            log.close()
     else:
-        PylosClient(args.name, (args.host, args.port), verbose=args.verbose)
+        if args.profile and not (args.engine or args.service):
+            parser.error('--profile needs --engine or --service')
+        PylosClient(
+            args.name, (args.host, args.port), verbose=args.verbose,
+            engine=service.ServiceEngine(service.parseaddress(args.service)) if args.service else
+            PylosEngine() if args.engine else None, timelimit=args.time,
+            stats=args.stats, profile=args.profile
+        )